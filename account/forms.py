@@ -2,19 +2,16 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, _unicode_ci_compare, UserChangeForm
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMultiAlternatives
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
 from account.models import Account
 from django.contrib.auth import authenticate, get_user_model, password_validation
 from django.utils.translation import gettext_lazy as _
-from django.template import loader
 
 UserModel = get_user_model()
 
-from django.conf import settings
-from mailjet_rest import Client
+from account.tasks import send_password_reset_mail
 
 # Django Admin forms
 
@@ -197,42 +194,18 @@ class PasswordResetForm(forms.Form):
             user=None
     ):
         """
-        Send a django.core.mail.EmailMultiAlternatives to `to_email`.
+        Queue the password reset email for `to_email`; a Celery worker renders
+        and sends it, so the request does not wait on the mail provider.
         """
-        subject = loader.render_to_string(subject_template_name, context)
-        # Email subject *must not* contain newlines
-        subject = "".join(subject.splitlines())
-        body = loader.render_to_string(email_template_name, context)
-
-        if html_email_template_name is not None:
-            html_email = loader.render_to_string(html_email_template_name, context)
-
-        mailjet = Client(auth=(settings.MAIL_JET_API_KEY, settings.MAIL_JET_API_SECRET), version='v3.1')
-        data = {
-            'Messages': [
-                {
-                    "From": {
-                        "Email": "admin@arpansahu.space",
-                        "Name": "Great Chat"
-                    },
-                    "To": [
-                        {
-                            "Email": to_email,
-                            "Name": user.username
-                        }
-                    ],
-                    "Subject": subject,
-                    "TextPart": body,
-                    "HTMLPart": body,
-                    "CustomID": f"{user.email}"
-                }
-            ]
-        }
-        result = mailjet.send.create(data=data)
-        if result:
-            print(f"Mail Send Successfully {result}")
-        else:
-            print(f"Mail Send Failed {result}")
+        context = {key: value for key, value in context.items() if key != 'user'}
+        send_password_reset_mail.delay(
+            subject_template_name,
+            email_template_name,
+            context,
+            to_email,
+            user.pk,
+            html_email_template_name=html_email_template_name,
+        )
 
     def get_users(self, email):
         """Given an email, return matching user(s) who should receive a reset.
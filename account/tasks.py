@@ -0,0 +1,97 @@
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.template import loader
+from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from account.models import Account
+from account.token import account_activation_token
+from send_email_app.delivery import send_batch
+from send_email_app.ledger import RetryableDeliveryError, is_retryable
+from send_email_app.metrics import RENDER_SECONDS, count_results
+
+# Transactional mail is retried quickly on transient provider errors; these
+# tasks are routed to the transactional queue (see CELERY_TASK_ROUTES).
+TRANSACTIONAL_MAIL_TASK_OPTIONS = {
+    'autoretry_for': (RetryableDeliveryError,),
+    'retry_backoff': 2,
+    'retry_backoff_max': 60,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+
+def transactional_message(to_email, to_name, subject, text_content, html_content):
+    return {
+        "From": {
+            "Email": "admin@arpansahu.space",
+            "Name": "Great Chat"
+        },
+        "To": [
+            {
+                "Email": to_email,
+                "Name": to_name
+            }
+        ],
+        "Subject": subject,
+        "TextPart": text_content,
+        "HTMLPart": html_content,
+        "CustomID": f"{to_email}"
+    }
+
+
+def send_transactional_message(message, template):
+    """Send one message; raise RetryableDeliveryError on a transient failure."""
+    result = send_batch([message])[0]
+    count_results([result], template)
+    if result.success:
+        print(f"Mail Send Successfully {result}")
+    elif is_retryable(result):
+        raise RetryableDeliveryError(f"Sending to {result.email} failed: {result.error}")
+    else:
+        print(f"Mail Send Failed {result}")
+    return result.success
+
+
+@shared_task(bind=True, name='clock_work.account.send_activation_mail', **TRANSACTIONAL_MAIL_TASK_OPTIONS)
+def send_activation_mail(self, user_pk, reciever_email, subject="Confirm Your Email"):
+    """Send the account activation link to a newly registered user"""
+    user = Account.objects.get(pk=user_pk)
+    with RENDER_SECONDS.labels('activate_account_mail').time():
+        message = render_to_string(template_name='account/activate_account_mail.html', context={
+            'user': user,
+            'protocol': settings.PROTOCOL,
+            'domain': settings.DOMAIN,
+            'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': account_activation_token.make_token(user),
+        })
+    send_transactional_message(transactional_message(
+        reciever_email, "Dear User", subject, message, f"<h3>Dear {user.username}, Message: {message}"
+    ), 'activate_account_mail')
+    print("account activation mail send")
+    return "Done"
+
+
+@shared_task(bind=True, name='clock_work.account.send_password_reset_mail', **TRANSACTIONAL_MAIL_TASK_OPTIONS)
+def send_password_reset_mail(self, subject_template_name, email_template_name, context, to_email, user_pk,
+                             html_email_template_name=None):
+    """
+    Render and send a password reset email. ``context`` is the form's
+    template context without the user, which is reloaded from ``user_pk``.
+    """
+    user = get_user_model().objects.get(pk=user_pk)
+    context = dict(context, user=user)
+    with RENDER_SECONDS.labels('password_reset').time():
+        subject = loader.render_to_string(subject_template_name, context)
+        # Email subject *must not* contain newlines
+        subject = "".join(subject.splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_email = body
+        if html_email_template_name is not None:
+            html_email = loader.render_to_string(html_email_template_name, context)
+
+    send_transactional_message(transactional_message(to_email, user.username, subject, body, html_email),
+                               'password_reset')
+    return "Done"
@@ -340,3 +340,64 @@ class AccountManagerTest(TestCase):
             password='pass123'
         )
         self.assertEqual(user.email, 'Test@example.com')
+
+
+class TransactionalMailTaskTest(TestCase):
+    """Test activation and password reset mail are sent by Celery tasks"""
+
+    def setUp(self):
+        self.user = Account.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+
+    def result(self, success=True, status_code=200):
+        from send_email_app.delivery import DeliveryResult
+        return [DeliveryResult('test@example.com', success, status_code, None, None if success else 'error')]
+
+    def test_activation_mail_is_queued(self):
+        """Test the registration helper only enqueues the activation mail"""
+        from unittest.mock import patch
+        from account.views import send_mail_account_activate
+        with patch('account.views.send_activation_mail.delay') as mock_delay:
+            send_mail_account_activate('test@example.com', self.user)
+        mock_delay.assert_called_once_with(self.user.pk, 'test@example.com', 'Confirm Your Email')
+
+    def test_activation_mail_contains_link(self):
+        """Test the task renders the activation link for the user"""
+        from unittest.mock import patch
+        from django.utils.encoding import force_bytes
+        from django.utils.http import urlsafe_base64_encode
+        from account.tasks import send_activation_mail
+        # The activation mail template is not part of the repository
+        with patch('account.tasks.render_to_string', side_effect=lambda template_name, context: context['uid']), \
+                patch('account.tasks.send_batch', return_value=self.result()) as mock_send:
+            send_activation_mail.apply(args=(self.user.pk, 'test@example.com'))
+        message = mock_send.call_args.args[0][0]
+        self.assertEqual(message['To'][0]['Email'], 'test@example.com')
+        self.assertEqual(message['TextPart'], urlsafe_base64_encode(force_bytes(self.user.pk)))
+
+    def test_activation_mail_retries_transient_errors(self):
+        """Test a rate-limited send is retried"""
+        from unittest.mock import patch
+        from account.tasks import send_activation_mail
+        with patch('account.tasks.render_to_string', return_value='link'), \
+                patch('account.tasks.send_batch', side_effect=[self.result(False, 429), self.result()]) as mock_send:
+            send_activation_mail.apply(args=(self.user.pk, 'test@example.com'), throw=False)
+        self.assertEqual(mock_send.call_count, 2)
+
+    def test_password_reset_mail_is_queued(self):
+        """Test the reset form enqueues the mail with a serialisable context"""
+        import json
+        from unittest.mock import patch
+        from account.forms import PasswordResetForm
+        user = User.objects.create_user(username='resetuser', email='reset@example.com', password='testpass123')
+        form = PasswordResetForm(data={'email': 'reset@example.com'})
+        self.assertTrue(form.is_valid())
+        with patch('account.forms.send_password_reset_mail.delay') as mock_delay:
+            form.save(domain_override='example.com')
+        args = mock_delay.call_args.args
+        self.assertEqual(args[3:], ('reset@example.com', user.pk))
+        self.assertNotIn('user', args[2])
+        json.dumps(args[2])
@@ -5,11 +5,10 @@ from django.contrib.auth.tokens import default_token_generator
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout, get_user_model
-from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
-from django.utils.encoding import force_bytes, force_str
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode
 from django.views import View
 from django.views.decorators.csrf import csrf_protect
 from django.views.generic import FormView, RedirectView
@@ -17,18 +16,12 @@ from django.utils.translation import gettext_lazy as _
 
 from django.views.generic import ListView, UpdateView, DetailView, CreateView, FormView
 from account.forms import RegistrationForm, AccountAuthenticationForm, AccountUpdateForm, PasswordResetForm, LoginForm
-from django.conf import settings
 from django.contrib.auth.views import PasswordContextMixin
 
 from account.models import Account
 from account.token import account_activation_token
 
-DOMAIN = settings.DOMAIN
-PROTOCOL = settings.PROTOCOL
-
-from mailjet_rest import Client
-
-mailjet = Client(auth=(settings.MAIL_JET_API_KEY, settings.MAIL_JET_API_SECRET), version='v3.1')
+from account.tasks import send_activation_mail
 
 
 # Create your views here.
@@ -65,37 +58,8 @@ class CustomPasswordResetView(PasswordContextMixin, FormView):
 
 
 def send_mail_account_activate(reciever_email, user, SUBJECT="Confirm Your Email"):
-    message = render_to_string(template_name='account/activate_account_mail.html', context={
-        'user': user,
-        'protocol': PROTOCOL,
-        'domain': DOMAIN,
-        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-        'token': account_activation_token.make_token(user),
-    })
-
-    data = {
-        'Messages': [
-            {
-                "From": {
-                    "Email": "admin@arpansahu.space",
-                    "Name": "Great Chat"
-                },
-                "To": [
-                    {
-                        "Email": reciever_email,
-                        "Name": "Dear User"
-                    }
-                ],
-                "Subject": SUBJECT,
-                "TextPart": message,
-                "HTMLPart": f"<h3>Dear {user.username}, Message: {message}",
-                "CustomID": f"{reciever_email}"
-            }
-        ]
-    }
-    result = mailjet.send.create(data=data)
-    print("account activation mail send")
-    return result
+    """Queue the activation email; it is rendered and sent by a Celery worker."""
+    return send_activation_mail.delay(user.pk, reciever_email, SUBJECT)
 
 
 def activate(request, uidb64, token):
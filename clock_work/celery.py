@@ -21,6 +21,14 @@ app.conf.beat_schedule = {
         'task': 'send_email_app.tasks.send_mail_func',
         'schedule': crontab(hour=0, minute=38),
         # 'args' : (2,)
+    },
+    'purge-mail-payloads-every-day': {
+        'task': 'clock_work.send_email_app.purge_mail_payloads',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'purge-fired-schedules-every-hour': {
+        'task': 'clock_work.purge_fired_schedules',
+        'schedule': crontab(minute=15),
     }
 }
 # Load task modules from all registered Django app configs.
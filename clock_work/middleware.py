@@ -0,0 +1,36 @@
+"""
+Per-user time zones.
+
+A user's IANA time zone is kept in their session and activated for each of
+their requests, so naive times they submit (e.g. from a datetime-local
+input) are read in their zone rather than in TIME_ZONE.
+"""
+from django.utils import timezone
+
+from clock_work.scheduling import get_zone
+
+TIMEZONE_SESSION_KEY = 'django_timezone'
+
+
+def set_user_timezone(request, name):
+    """
+    Remember time zone ``name`` for the user of ``request`` and activate it.
+    Raises ValueError for an unknown zone.
+    """
+    zone = get_zone(name)
+    request.session[TIMEZONE_SESSION_KEY] = name
+    timezone.activate(zone)
+    return zone
+
+
+class TimezoneMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name = request.session.get(TIMEZONE_SESSION_KEY)
+        try:
+            timezone.activate(get_zone(name)) if name else timezone.deactivate()
+        except ValueError:
+            timezone.deactivate()
+        return self.get_response(request)
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+
+
+class ThrottledProgressRecorder:
+    """
+    Coalescing wrapper around a celery_progress recorder.
+
+    ``ProgressRecorder`` writes to the result backend and
+    ``WebSocketProgressRecorder`` additionally does a channel layer
+    group_send on every ``set_progress`` call. This wrapper only forwards an
+    update when ``1 / max_per_second`` seconds have passed or progress moved
+    by ``percent_step`` percent since the last one. The first and the final
+    (``current >= total``) updates are always forwarded.
+    """
+
+    def __init__(self, recorder, max_per_second=None, percent_step=None):
+        if max_per_second is None:
+            max_per_second = getattr(settings, 'PROGRESS_UPDATES_PER_SECOND', 2)
+        if percent_step is None:
+            percent_step = getattr(settings, 'PROGRESS_PERCENT_STEP', 5)
+        self.recorder = recorder
+        self.interval = 1.0 / max_per_second if max_per_second else 0
+        self.percent_step = percent_step
+        self.last_emit = None
+        self.last_percent = None
+        self.pending = None
+
+    def set_progress(self, current, total, description=""):
+        percent = current * 100.0 / total if total else 100.0
+        now = time.monotonic()
+        if (
+            self.last_emit is None
+            or current >= total
+            or now - self.last_emit >= self.interval
+            or (self.percent_step and percent - self.last_percent >= self.percent_step)
+        ):
+            return self.emit(now, percent, current, total, description)
+        self.pending = (current, total, description)
+
+    def emit(self, now, percent, current, total, description):
+        self.last_emit = now
+        self.last_percent = percent
+        self.pending = None
+        return self.recorder.set_progress(current, total, description)
+
+    def flush(self):
+        """Forward the latest swallowed update, if any."""
+        if self.pending is not None:
+            current, total, description = self.pending
+            percent = current * 100.0 / total if total else 100.0
+            return self.emit(time.monotonic(), percent, current, total, description)
@@ -0,0 +1,170 @@
+"""
+One-off scheduling of Celery tasks.
+
+With REMINDER_BACKEND = 'database' (the default) a reminder is a
+notifications_app Reminder row, enqueued at its due time by the
+``dispatch_reminders`` process. With 'beat' every reminder gets its own
+ClockedSchedule and a ``one_off`` PeriodicTask: beat runs it once at the
+clocked time and then disables it, so DatabaseScheduler, which only loads
+enabled tasks, stops evaluating it. ``purge_fired_schedules`` (run hourly
+by beat) deletes fired tasks, their schedules and dispatched reminders.
+
+Times are stored in UTC. ``resolve_when`` turns user input into a UTC
+datetime, reading naive times in the user's time zone (see
+``clock_work.middleware.TimezoneMiddleware``). Many reminders share a few
+popular times, so the ClockedSchedule of each future time is remembered in
+a process-local LRU cache and looked up in the database only once.
+"""
+import datetime
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from functools import partial
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_celery_beat.models import ClockedSchedule, PeriodicTask, PeriodicTasks
+
+
+def get_zone(name):
+    """Return the ZoneInfo for IANA zone ``name``; ValueError if there is none."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        raise ValueError(f"Unknown time zone {name!r}")
+
+
+def resolve_when(value, tz=None):
+    """
+    Return ``value``, an ISO 8601 string or a datetime, as an aware UTC
+    datetime. A naive value is a wall-clock time in ``tz`` (a zone name or
+    tzinfo), by default the current time zone. Raises ValueError.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(str(value))
+    if timezone.is_naive(value):
+        tz = get_zone(tz) if isinstance(tz, str) else tz
+        value = timezone.make_aware(value, tz)
+    return value.astimezone(datetime.timezone.utc)
+
+
+class ClockedScheduleCache:
+    """
+    A thread-safe LRU mapping of clocked times to ClockedSchedule ids.
+    Only future times are kept: ``purge_fired_schedules`` only deletes
+    schedules whose time has passed, so a cached future id stays valid.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, times, now):
+        found = {}
+        with self.lock:
+            for when in times:
+                if when > now and when in self.entries:
+                    self.entries.move_to_end(when)
+                    found[when] = self.entries[when]
+        return found
+
+    def set_many(self, schedule_ids, now):
+        with self.lock:
+            for when, schedule_id in schedule_ids.items():
+                if when > now:
+                    self.entries[when] = schedule_id
+                    self.entries.move_to_end(when)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+clocked_schedule_cache = ClockedScheduleCache(settings.SCHEDULE_CACHE_SIZE)
+
+
+def clocked_schedule_ids(times):
+    """
+    Return ``{time: ClockedSchedule id}`` for ``times``, reusing cached and
+    existing schedules and creating the rest with one INSERT.
+    """
+    now = timezone.now()
+    schedule_ids = clocked_schedule_cache.get_many(times, now)
+    missing = set(times) - set(schedule_ids)
+    if missing:
+        found = dict(ClockedSchedule.objects.filter(clocked_time__in=missing).values_list('clocked_time', 'id'))
+        created = ClockedSchedule.objects.bulk_create(
+            [ClockedSchedule(clocked_time=when) for when in missing if when not in found]
+        )
+        found.update((schedule.clocked_time, schedule.id) for schedule in created)
+        # Only cache ids once they are committed, a rollback would leave them dangling
+        transaction.on_commit(partial(clocked_schedule_cache.set_many, found, now))
+        schedule_ids.update(found)
+    return schedule_ids
+
+
+def unique_schedule_name(prefix):
+    """A schedule name that cannot collide with an existing one, without querying for them."""
+    return f"{prefix}{uuid.uuid4().hex}"
+
+
+def schedule_once(name, task, when, args=(), kwargs=None):
+    """
+    Run ``task`` once at ``when``, anything ``resolve_when`` accepts (naive
+    times are taken in the current time zone). Returns the Reminder or
+    PeriodicTask, by REMINDER_BACKEND.
+    """
+    return schedule_many([(name, task, when, args, kwargs)])[0]
+
+
+def schedule_many(entries):
+    """
+    Schedule a list of ``(name, task, when, args, kwargs)`` entries like
+    ``schedule_once``, with one INSERT per table. With the beat backend the
+    clocked schedules of the times are taken from the cache, or found with
+    one lookup, and reused. Returns the Reminders or PeriodicTasks, in order.
+    """
+    entries = [
+        (name, task, resolve_when(when), list(args), kwargs or {})
+        for name, task, when, args, kwargs in entries
+    ]
+    if settings.REMINDER_BACKEND == 'database':
+        from notifications_app.models import Reminder
+        return Reminder.objects.bulk_create([
+            Reminder(name=name, task=task, due_at=when, args=args, kwargs=kwargs)
+            for name, task, when, args, kwargs in entries
+        ])
+
+    with transaction.atomic():
+        clocked = clocked_schedule_ids({when for _, _, when, _, _ in entries})
+        tasks = PeriodicTask.objects.bulk_create([
+            PeriodicTask(name=name, task=task, clocked_id=clocked[when], one_off=True, args=json.dumps(args),
+                         kwargs=json.dumps(kwargs))
+            for name, task, when, args, kwargs in entries
+        ])
+        # bulk_create skips PeriodicTask.save, which tells beat to reload its schedule
+        PeriodicTasks.update_changed()
+    return tasks
+
+
+def purge_fired_schedules():
+    """
+    Delete the one-off tasks beat has already run, every past clocked
+    schedule no task uses any more, and old dispatched reminders. Returns
+    the number of tasks and reminders deleted.
+
+    Unused future schedules are kept, they may be cached by any process.
+    """
+    from notifications_app.reminders import purge_dispatched_reminders
+
+    fired = PeriodicTask.objects.filter(one_off=True, enabled=False, last_run_at__isnull=False)
+    deleted, _ = fired.delete()
+    ClockedSchedule.objects.filter(Q(periodictask__isnull=True), clocked_time__lte=timezone.now()).delete()
+    return deleted + purge_dispatched_reminders()
@@ -82,6 +82,43 @@ MAIL_JET_API_KEY = config('MAIL_JET_API_KEY')
 MAIL_JET_API_SECRET = config('MAIL_JET_API_SECRET')
 MAIL_JET_EMAIL_ADDRESS = config('MAIL_JET_EMAIL_ADDRESS')
 MY_EMAIL_ADDRESS = config('MY_EMAIL_ADDRESS')
+# Messages per Mailjet v3.1 Send API request (the API accepts at most 50)
+MAIL_JET_BATCH_SIZE = config('MAIL_JET_BATCH_SIZE', default=50, cast=int)
+# Shared keep-alive HTTP session used for every Mailjet call (see send_email_app/mailjet_client.py)
+MAIL_JET_POOL_SIZE = config('MAIL_JET_POOL_SIZE', default=10, cast=int)
+MAIL_JET_CONNECT_TIMEOUT = config('MAIL_JET_CONNECT_TIMEOUT', default=5, cast=float)
+MAIL_JET_READ_TIMEOUT = config('MAIL_JET_READ_TIMEOUT', default=30, cast=float)
+MAIL_JET_MAX_RETRIES = config('MAIL_JET_MAX_RETRIES', default=3, cast=int)
+MAIL_JET_RETRY_BACKOFF = config('MAIL_JET_RETRY_BACKOFF', default=0.5, cast=float)
+# Concurrent Send API requests and request rate cap for async_send_mail_task
+MAIL_JET_ASYNC_CONCURRENCY = config('MAIL_JET_ASYNC_CONCURRENCY', default=10, cast=int)
+MAIL_JET_REQUESTS_PER_SECOND = config('MAIL_JET_REQUESTS_PER_SECOND', default=10, cast=float)
+# Mailjet API calls per second across all workers, enforced by a token bucket
+# in Redis (0 disables it); 429s cut the rate for MAIL_JET_RATE_LIMIT_COOLDOWN seconds
+MAIL_JET_RATE_LIMIT = config('MAIL_JET_RATE_LIMIT', default=10, cast=float)
+MAIL_JET_RATE_LIMIT_BURST = config('MAIL_JET_RATE_LIMIT_BURST', default=10, cast=float)
+MAIL_JET_RATE_LIMIT_COOLDOWN = config('MAIL_JET_RATE_LIMIT_COOLDOWN', default=60, cast=int)
+# How emails are delivered: send_email_app.transports.MailjetTransport, DjangoEmailTransport
+# (Django's EMAIL_BACKEND) or FakeTransport (simulated provider for load testing)
+EMAIL_TRANSPORT = config('EMAIL_TRANSPORT', default='send_email_app.transports.MailjetTransport')
+FAKE_TRANSPORT_LATENCY = config('FAKE_TRANSPORT_LATENCY', default=0.2, cast=float)
+FAKE_TRANSPORT_ERROR_RATE = config('FAKE_TRANSPORT_ERROR_RATE', default=0.0, cast=float)
+FAKE_TRANSPORT_RATE_LIMITED_RATE = config('FAKE_TRANSPORT_RATE_LIMITED_RATE', default=0.0, cast=float)
+# Skip recipients found in the Redis suppression set, when enqueueing and again before rendering
+EMAIL_SUPPRESSION_LIST = config('EMAIL_SUPPRESSION_LIST', default=True, cast=bool)
+# Token Mailjet must pass as ?token= to the event webhook (empty refuses every event)
+MAIL_JET_WEBHOOK_TOKEN = config('MAIL_JET_WEBHOOK_TOKEN', default='')
+# Days to keep stored notification payloads (recipients, headline, body) once sent
+MAIL_PAYLOAD_RETENTION_DAYS = config('MAIL_PAYLOAD_RETENTION_DAYS', default=30, cast=int)
+# Days to keep delivery ledger rows, which let a retried send skip recipients already mailed
+MAIL_DELIVERY_RETENTION_DAYS = config('MAIL_DELIVERY_RETENTION_DAYS', default=30, cast=int)
+# Recipients between two saved checkpoints of a bulk send
+MAIL_CHECKPOINT_INTERVAL = config('MAIL_CHECKPOINT_INTERVAL', default=500, cast=int)
+# Seconds without checkpoint progress after which a bulk send's run is considered dead
+MAIL_CHECKPOINT_STALE_SECONDS = config('MAIL_CHECKPOINT_STALE_SECONDS', default=300, cast=int)
+# Send email HTML with its CSS inlined; the inlined templates are cached here
+EMAIL_INLINE_CSS = config('EMAIL_INLINE_CSS', default=True, cast=bool)
+EMAIL_TEMPLATE_CACHE_DIR = config('EMAIL_TEMPLATE_CACHE_DIR', default=os.path.join(BASE_DIR, 'email_cache'))
 
 # Domain and Protocol Configuration
 if DEBUG:
@@ -97,6 +134,9 @@ SENTRY_PROJECT = config('SENTRY_PROJECT', default='')
 SENTRY_ENVIRONMENT = config('SENTRY_ENVIRONMENT')  # production Or "staging", "development", etc.
 SENTRY_DSH_URL = config('SENTRY_DSH_URL')
 
+# Bearer token required by the Prometheus /metrics/ endpoint (empty refuses every scrape)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Harbor Configuration
 HARBOR_URL = config('HARBOR_URL', default='https://harbor.arpansahu.space')
 HARBOR_USERNAME = config('HARBOR_USERNAME', default='admin')
@@ -138,6 +178,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'clock_work.middleware.TimezoneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -328,10 +369,42 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Kolkata'
 CELERY_TASK_DEFAULT_QUEUE = 'clock_work_queue'
 
+# Transactional mail (account activation, password reset) and bulk sends get
+# their own queues and consumers, so a broadcast never delays a single email.
+# Everything else stays on the default queue.
+CELERY_TRANSACTIONAL_QUEUE = 'clock_work_transactional'
+CELERY_BULK_QUEUE = 'clock_work_bulk'
+CELERY_TASK_ROUTES = {
+    'clock_work.account.*': {'queue': CELERY_TRANSACTIONAL_QUEUE},
+    'clock_work.send_email_app.send_mail_func': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.send_welcome_mail_chunk': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.aggregate_send_results': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.send_mail_task': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.send_mail_task_with_schedule': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.web_socket_send_mail_task': {'queue': CELERY_BULK_QUEUE},
+    'clock_work.send_email_app.async_send_mail_task': {'queue': CELERY_BULK_QUEUE},
+}
+
+# celery_progress updates are coalesced to at most this many per second, or
+# one per PROGRESS_PERCENT_STEP percent (see clock_work/progress.py)
+PROGRESS_UPDATES_PER_SECOND = config('PROGRESS_UPDATES_PER_SECOND', default=2, cast=float)
+PROGRESS_PERCENT_STEP = config('PROGRESS_PERCENT_STEP', default=5, cast=float)
+
+# Users per send_welcome_mail_chunk subtask when mailing every account
+BULK_MAIL_CHUNK_SIZE = config('BULK_MAIL_CHUNK_SIZE', default=500, cast=int)
+
 # CELERY BEAT
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# One-off reminders: 'database' (Reminder rows enqueued by `manage.py dispatch_reminders`)
+# or 'beat' (a one-off ClockedSchedule PeriodicTask each)
+REMINDER_BACKEND = config('REMINDER_BACKEND', default='database')
+REMINDER_DISPATCH_BATCH_SIZE = config('REMINDER_DISPATCH_BATCH_SIZE', default=500, cast=int)
+REMINDER_POLL_INTERVAL = config('REMINDER_POLL_INTERVAL', default=0.2, cast=float)
+# ClockedSchedule ids remembered per process by clock_work.scheduling
+SCHEDULE_CACHE_SIZE = config('SCHEDULE_CACHE_SIZE', default=1024, cast=int)
+
 
 try:
     import channels
@@ -1,8 +1,16 @@
 from celery import shared_task
 
+from .scheduling import purge_fired_schedules
+
 @shared_task(bind=True)
 def test_func(self):
     print("inside test func")
     for i in range(10):
         print(i)
-    return "Done"
\ No newline at end of file
+    return "Done"
+
+
+@shared_task(bind=True, name='clock_work.purge_fired_schedules')
+def purge_fired_schedules_task(self):
+    """Delete one-off reminder schedules and reminders that have already run"""
+    return f"Deleted {purge_fired_schedules()} fired schedules"
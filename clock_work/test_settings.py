@@ -4,6 +4,7 @@ Test Settings for Clock Work
 Uses SQLite in-memory database for faster test execution.
 """
 import os
+import tempfile
 from .settings import *
 
 # Use SQLite for tests - much faster than PostgreSQL
@@ -28,6 +29,12 @@ LOGGING = {}
 # Use a simple email backend
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 
+# Keep inlined email templates out of the source tree
+EMAIL_TEMPLATE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'clock_work_email_cache')
+
+# No shared Mailjet rate limiting in tests (TokenBucket is tested directly)
+MAIL_JET_RATE_LIMIT = 0
+
 # Celery settings for tests
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
@@ -1,8 +1,9 @@
 """
 Tests for clock_work main app
 """
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from zoneinfo import ZoneInfo
 from clock_work import views
 
 
@@ -99,3 +100,218 @@ class TasksAppTasksTest(TestCase):
         from tasks.tasks import ws_task, ws_error_task
         self.assertTrue(hasattr(ws_task, 'delay'))
         self.assertTrue(hasattr(ws_error_task, 'delay'))
+
+
+class ThrottledProgressRecorderTest(TestCase):
+    """Test coalescing of celery_progress updates"""
+
+    def make_recorder(self, **kwargs):
+        from unittest.mock import MagicMock
+        from clock_work.progress import ThrottledProgressRecorder
+        inner = MagicMock()
+        return inner, ThrottledProgressRecorder(inner, **kwargs)
+
+    def test_updates_are_coalesced_by_time(self):
+        """Test at most one update per interval plus the final state"""
+        from unittest.mock import patch
+        inner, recorder = self.make_recorder(max_per_second=1, percent_step=0)
+        with patch('clock_work.progress.time.monotonic', return_value=100.0):
+            for i in range(1, 10000):
+                recorder.set_progress(i, 10000)
+            recorder.set_progress(10000, 10000, 'done')
+        self.assertEqual(inner.set_progress.call_count, 2)
+        inner.set_progress.assert_called_with(10000, 10000, 'done')
+
+    def test_updates_are_emitted_every_percent_step(self):
+        """Test an update is forwarded each time progress moves by the step"""
+        from unittest.mock import patch
+        inner, recorder = self.make_recorder(max_per_second=0.001, percent_step=10)
+        with patch('clock_work.progress.time.monotonic', return_value=100.0):
+            for i in range(1, 1001):
+                recorder.set_progress(i, 1000)
+        self.assertEqual(inner.set_progress.call_count, 11)
+
+    def test_updates_are_emitted_after_interval(self):
+        """Test an update is forwarded once the interval has elapsed"""
+        from unittest.mock import patch
+        inner, recorder = self.make_recorder(max_per_second=2, percent_step=0)
+        with patch('clock_work.progress.time.monotonic', side_effect=[0.0, 0.1, 0.6]):
+            recorder.set_progress(1, 100)
+            recorder.set_progress(2, 100)
+            recorder.set_progress(3, 100)
+        self.assertEqual([c.args[0] for c in inner.set_progress.call_args_list], [1, 3])
+
+    def test_flush_forwards_pending_update(self):
+        """Test flush emits the last swallowed update"""
+        from unittest.mock import patch
+        inner, recorder = self.make_recorder(max_per_second=1, percent_step=0)
+        with patch('clock_work.progress.time.monotonic', return_value=5.0):
+            recorder.set_progress(1, 10)
+            recorder.set_progress(4, 10, 'four')
+            recorder.flush()
+            recorder.flush()
+        self.assertEqual(inner.set_progress.call_count, 2)
+        inner.set_progress.assert_called_with(4, 10, 'four')
+
+
+class CeleryRoutingTest(TestCase):
+    """Test transactional and bulk mail are routed to their own queues"""
+
+    def route(self, name):
+        from clock_work.celery import app
+        return app.amqp.router.route({}, name)['queue'].name
+
+    def test_transactional_mail_queue(self):
+        """Test account mail tasks go to the transactional queue"""
+        self.assertEqual(self.route('clock_work.account.send_activation_mail'), 'clock_work_transactional')
+
+    def test_bulk_mail_queue(self):
+        """Test bulk sends and their chunk subtasks go to the bulk queue"""
+        self.assertEqual(self.route('clock_work.send_email_app.send_mail_task'), 'clock_work_bulk')
+        self.assertEqual(self.route('clock_work.send_email_app.send_welcome_mail_chunk'), 'clock_work_bulk')
+
+    def test_other_tasks_use_default_queue(self):
+        """Test unrelated tasks stay on the default queue"""
+        self.assertEqual(self.route('clock_work.send_email_app.ws_task'), 'clock_work_queue')
+
+
+class MetricsViewTest(TestCase):
+    """Test the Prometheus metrics endpoint"""
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_exposes_mail_metrics(self):
+        """Test /metrics/ serves the mail pipeline metrics in the text format"""
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'clock_work_email_render_seconds', response.content)
+
+    def test_metrics_refused_without_token(self):
+        """Test /metrics/ refuses every request while no METRICS_TOKEN is configured"""
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 401)
+
+    def test_metrics_token_required(self):
+        """Test /metrics/ requires the configured bearer token"""
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REMINDER_BACKEND='beat')
+class OneOffScheduleTest(TestCase):
+    """Test one-off ClockedSchedule reminders"""
+
+    def test_schedule_once_creates_one_off_clocked_task(self):
+        """Test schedule_once makes an aware one-off clocked task"""
+        from datetime import datetime
+        from clock_work.scheduling import schedule_once
+
+        task = schedule_once('reminder', 'clock_work.send_email_app.send_mail_task_with_schedule',
+                             datetime(2030, 1, 1, 10, 0), kwargs={'payload_id': 1})
+        self.assertTrue(task.one_off)
+        self.assertIsNone(task.crontab)
+        self.assertEqual(str(task.clocked.clocked_time.astimezone()), '2030-01-01 10:00:00+05:30')
+
+    def test_purge_deletes_only_fired_schedules(self):
+        """Test fired one-off tasks and their clocked schedules are deleted, pending ones kept"""
+        from datetime import datetime
+        from django.utils import timezone
+        from django_celery_beat.models import ClockedSchedule, PeriodicTask
+        from clock_work.scheduling import purge_fired_schedules, schedule_once
+
+        fired = schedule_once('fired', 'x', datetime(2020, 1, 1))
+        PeriodicTask.objects.filter(pk=fired.pk).update(enabled=False, last_run_at=timezone.now())
+        pending = schedule_once('pending', 'x', datetime(2030, 1, 1))
+
+        self.assertEqual(purge_fired_schedules(), 1)
+        self.assertEqual(list(PeriodicTask.objects.values_list('name', flat=True)), ['pending'])
+        self.assertEqual(list(ClockedSchedule.objects.all()), [pending.clocked])
+
+    def test_purge_keeps_unused_future_schedules(self):
+        """Test an unused clocked schedule is only purged once its time has passed"""
+        from datetime import datetime
+        from django_celery_beat.models import ClockedSchedule
+        from clock_work.scheduling import purge_fired_schedules
+
+        ClockedSchedule.objects.create(clocked_time=datetime(2020, 1, 1, tzinfo=ZoneInfo('UTC')))
+        future = ClockedSchedule.objects.create(clocked_time=datetime(2030, 1, 1, tzinfo=ZoneInfo('UTC')))
+        purge_fired_schedules()
+        self.assertEqual(list(ClockedSchedule.objects.all()), [future])
+
+    def test_clocked_schedules_are_cached(self):
+        """Test repeated reminders at one time reuse the cached schedule without looking it up"""
+        from datetime import datetime
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from clock_work.scheduling import clocked_schedule_cache, schedule_once
+
+        clocked_schedule_cache.clear()
+        self.addCleanup(clocked_schedule_cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = schedule_once('first', 'x', datetime(2030, 1, 1, 9, 0))
+        with CaptureQueriesContext(connection) as queries:
+            second = schedule_once('second', 'x', datetime(2030, 1, 1, 9, 0))
+        self.assertEqual(second.clocked_id, first.clocked_id)
+        self.assertFalse([q for q in queries.captured_queries if 'clockedschedule' in q['sql']])
+
+    def test_rolled_back_schedules_are_not_cached(self):
+        """Test a schedule created in a rolled back transaction is not remembered"""
+        from datetime import datetime
+        from django.db import transaction
+        from clock_work.scheduling import clocked_schedule_cache, schedule_once
+
+        clocked_schedule_cache.clear()
+        self.addCleanup(clocked_schedule_cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    schedule_once('rolled-back', 'x', datetime(2030, 1, 1, 9, 0))
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(clocked_schedule_cache.entries, {})
+
+
+class ResolveWhenTest(TestCase):
+    """Test user input is resolved to UTC"""
+
+    def test_naive_times_use_the_given_or_current_zone(self):
+        """Test a naive time is read in the given zone, else the active one"""
+        from datetime import datetime
+        from django.utils import timezone
+        from clock_work.scheduling import resolve_when
+
+        self.assertEqual(resolve_when('2030-01-01T09:00'), datetime(2030, 1, 1, 3, 30, tzinfo=ZoneInfo('UTC')))
+        self.assertEqual(resolve_when('2030-01-01T09:00:00', 'America/New_York'),
+                         datetime(2030, 1, 1, 14, 0, tzinfo=ZoneInfo('UTC')))
+        with timezone.override('Europe/London'):
+            self.assertEqual(resolve_when(datetime(2030, 7, 1, 9, 0)),
+                             datetime(2030, 7, 1, 8, 0, tzinfo=ZoneInfo('UTC')))
+
+    def test_offsets_win_and_bad_input_raises(self):
+        """Test an explicit offset is kept and invalid times or zones raise ValueError"""
+        from datetime import datetime
+        from clock_work.scheduling import resolve_when
+
+        self.assertEqual(resolve_when('2030-01-01T09:00+02:00', 'America/New_York'),
+                         datetime(2030, 1, 1, 7, 0, tzinfo=ZoneInfo('UTC')))
+        for value, zone in (('tomorrow', None), (None, None), ('2030-01-01T09:00', 'Mars/Base')):
+            with self.assertRaises(ValueError):
+                resolve_when(value, zone)
+
+    def test_session_timezone_is_activated(self):
+        """Test TimezoneMiddleware activates the zone stored in the session"""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from django.utils import timezone
+        from clock_work.middleware import TIMEZONE_SESSION_KEY, TimezoneMiddleware
+
+        request = RequestFactory().get('/')
+        request.session = {TIMEZONE_SESSION_KEY: 'America/New_York'}
+        seen = []
+        TimezoneMiddleware(lambda request: seen.append(timezone.get_current_timezone_name()) or HttpResponse())(request)
+        timezone.deactivate()
+        self.assertEqual(seen, ['America/New_York'])
@@ -21,11 +21,14 @@ from django.views.generic import RedirectView
 import time
 from .views import (
     CeleryTest,
-    Home
+    Home,
+    Metrics
 )
 
 from send_email_app.views import (
+    BulkScheduleMail,
     CelerySendMailToAll,
+    MailjetEvents,
     ScheduleMail,
     SendMail,
     WebSocketSendMail,
@@ -50,10 +53,13 @@ urlpatterns = [
     path('favicon.ico', RedirectView.as_view(url=settings.STATIC_URL + 'favicon.ico', permanent=True)),
     path('', Home.as_view(), name='home'),
     path('test', CeleryTest.as_view(), name="test"),
+    path('metrics/', Metrics.as_view(), name="metrics"),
     path('sendmailtoall/', CelerySendMailToAll.as_view(), name="sendmail_to_all"),
     path('schedule_mail/', ScheduleMail.as_view(), name="schedule_mail"),
+    path('schedule_mail/bulk/', BulkScheduleMail.as_view(), name="bulk_schedule_mail"),
     path('send_mail/', SendMail.as_view(), name="send_mail"),
     path('web-socket-send-mail/', SendMail.as_view(), name="web_socket_send_mail"),
+    path('mailjet/events/', MailjetEvents.as_view(), name="mailjet_events"),
     path('celery-progress/', include('celery_progress.urls')),
     path('test/notification/', test, name='test_notification'),
     re_path('tasks/', include('tasks.urls')),
@@ -1,6 +1,11 @@
+import os
+
+from django.conf import settings
 from django.http import request, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
 from django.views.generic import View
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
 from .tasks import test_func
 
 
@@ -13,3 +18,23 @@ class CeleryTest(View):
     def get(self, *args, **kwargs):
         test_func.delay()
         return HttpResponse("Done")
+
+
+class Metrics(View):
+    """
+    Prometheus metrics, for scrapers sending ``Authorization: Bearer
+    <METRICS_TOKEN>``; without a configured token every request is refused.
+    With PROMETHEUS_MULTIPROC_DIR set the samples written by every process
+    sharing that directory are aggregated.
+    """
+
+    def get(self, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        if not token or not constant_time_compare(self.request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
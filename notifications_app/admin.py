@@ -1,5 +1,12 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import BroadcastNotification
-admin.site.register(BroadcastNotification)
\ No newline at end of file
+from .models import BroadcastNotification, Reminder
+admin.site.register(BroadcastNotification)
+
+
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ('name', 'task', 'due_at', 'status', 'dispatched_at')
+    list_filter = ('status', 'task')
+    search_fields = ('name',)
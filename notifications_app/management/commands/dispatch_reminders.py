@@ -0,0 +1,22 @@
+# notifications_app/management/commands/dispatch_reminders.py
+
+from django.core.management.base import BaseCommand
+
+from notifications_app.reminders import dispatch_due_reminders, run_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Enqueue due reminders, claiming them in batches (runs until stopped unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Reminders claimed per transaction')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to sleep when nothing more is due')
+        parser.add_argument('--once', action='store_true', help='Dispatch one batch and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = dispatch_due_reminders(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Dispatched {count} reminders'))
+            return
+        self.stdout.write('Dispatching reminders...')
+        run_dispatcher(options['batch_size'], options['poll_interval'])
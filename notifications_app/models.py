@@ -1,8 +1,10 @@
 from django.db import models
+from django.db.models import Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django_celery_beat.models import MINUTES, PeriodicTask, CrontabSchedule, PeriodicTasks
-import json
+
+from clock_work.models import AbstractBaseModel
+from clock_work.scheduling import schedule_once
 # Create your models here.
 class BroadcastNotification(models.Model):
     message = models.TextField()
@@ -16,8 +18,46 @@ class BroadcastNotification(models.Model):
 def notification_handler(sender, instance, created, **kwargs):
     # call group_send function directly to send notificatoions or you can create a dynamic task in celery beat
     if created:
-        schedule, created = CrontabSchedule.objects.get_or_create(hour = instance.broadcast_on.hour, minute = instance.broadcast_on.minute, day_of_month = instance.broadcast_on.day, month_of_year = instance.broadcast_on.month)
-        task = PeriodicTask.objects.create(crontab=schedule, name="broadcast-notification-"+str(instance.id), task="notifications_app.tasks.broadcast_notification", args=json.dumps((instance.id,)))
+        schedule_once("broadcast-notification-"+str(instance.id), 'clock_work.notifications.broadcast_notification',
+                      instance.broadcast_on, args=(instance.id,))
 
     #if not created:
 
+
+class Reminder(AbstractBaseModel):
+    """
+    A task to enqueue once at ``due_at``. Pending reminders are claimed in
+    ``due_at`` order by the dispatcher (``manage.py dispatch_reminders``)
+    through a partial index that only covers pending rows, so claiming a
+    batch costs the same however many reminders are waiting.
+    """
+    PENDING = 'pending'
+    DISPATCHED = 'dispatched'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (DISPATCHED, 'Dispatched'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    due_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_at'], condition=Q(status='pending'), name='reminder_pending_due_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} at {self.due_at} ({self.status})"
+
+    @property
+    def task_id(self):
+        # Stable, so a reminder enqueued twice runs under the same id
+        return f"reminder-{self.pk}"
@@ -0,0 +1,75 @@
+"""
+Dispatcher for Reminder rows.
+
+Each pass claims up to ``batch_size`` due reminders with
+``SELECT ... FOR UPDATE SKIP LOCKED`` in ``due_at`` order, enqueues their
+tasks and marks them dispatched in the same transaction, so several
+dispatchers can run side by side without enqueueing a reminder twice. A
+task is enqueued under the reminder's stable task id before the claim is
+committed: if enqueueing or the commit fails the batch is claimed again on
+the next pass and its tasks are enqueued under the same ids.
+"""
+import time
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Reminder
+
+# Dispatched reminders are kept this long before purge_dispatched_reminders deletes them
+DISPATCHED_RETENTION = timedelta(days=1)
+
+
+def dispatch_due_reminders(batch_size=None, now=None):
+    """Enqueue one batch of due reminders; returns how many were claimed."""
+    batch_size = batch_size or settings.REMINDER_DISPATCH_BATCH_SIZE
+    now = now or timezone.now()
+    with transaction.atomic():
+        reminders = list(
+            Reminder.objects.select_for_update(skip_locked=True)
+            .filter(status=Reminder.PENDING, due_at__lte=now)
+            .order_by('due_at')[:batch_size]
+        )
+        for reminder in reminders:
+            try:
+                task = current_app.tasks[reminder.task]
+            except KeyError:
+                print(f"Reminder {reminder.pk} has unknown task {reminder.task}")
+                reminder.status, reminder.error = Reminder.FAILED, f"Unknown task {reminder.task}"
+            else:
+                # A broker error propagates and rolls the claim back, so the batch is retried
+                task.apply_async(args=reminder.args, kwargs=reminder.kwargs, task_id=reminder.task_id)
+                reminder.status = Reminder.DISPATCHED
+            reminder.dispatched_at = now
+        Reminder.objects.bulk_update(reminders, ['status', 'error', 'dispatched_at'])
+    return len(reminders)
+
+
+def run_dispatcher(batch_size=None, poll_interval=None, stop=None):
+    """
+    Dispatch due reminders until ``stop()`` returns true. Full batches are
+    followed by the next one straight away; otherwise the loop sleeps
+    ``poll_interval`` seconds, which bounds the dispatch lag.
+    """
+    batch_size = batch_size or settings.REMINDER_DISPATCH_BATCH_SIZE
+    poll_interval = settings.REMINDER_POLL_INTERVAL if poll_interval is None else poll_interval
+    while not (stop and stop()):
+        close_old_connections()
+        try:
+            dispatched = dispatch_due_reminders(batch_size)
+        except Exception as e:
+            print(f"Dispatching reminders failed: {e}")
+            dispatched = 0
+        if dispatched < batch_size:
+            time.sleep(poll_interval)
+
+
+def purge_dispatched_reminders():
+    """Delete reminders dispatched more than DISPATCHED_RETENTION ago."""
+    deleted, _ = Reminder.objects.filter(
+        status=Reminder.DISPATCHED, dispatched_at__lt=timezone.now() - DISPATCHED_RETENTION
+    ).delete()
+    return deleted
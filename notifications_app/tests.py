@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from notifications_app.models import BroadcastNotification
 from datetime import datetime, timedelta
 from django.utils import timezone
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -46,6 +47,54 @@ class BroadcastNotificationModelTest(TestCase):
         self.assertEqual(notifications[0], notification2)
         self.assertEqual(notifications[1], self.notification)
 
+    def test_notification_schedules_one_off_broadcast(self):
+        """Test creating a notification schedules a one-off broadcast at its time"""
+        from notifications_app.models import Reminder
+        reminder = Reminder.objects.get(name=f'broadcast-notification-{self.notification.id}')
+        self.assertEqual(reminder.due_at, self.broadcast_time)
+        self.assertEqual(reminder.task, 'clock_work.notifications.broadcast_notification')
+        self.assertEqual(reminder.args, [self.notification.id])
+
+
+class ReminderDispatchTest(TestCase):
+    """Test the Reminder dispatcher"""
+
+    def make_reminder(self, name, due_at, task='clock_work.notifications.broadcast_notification'):
+        from notifications_app.models import Reminder
+        return Reminder.objects.create(name=name, task=task, due_at=due_at, args=[1])
+
+    @patch('notifications_app.tasks.broadcast_notification.apply_async')
+    def test_due_reminders_are_dispatched_in_order(self, mock_apply):
+        """Test only due reminders are enqueued, oldest first, in batches"""
+        from notifications_app.models import Reminder
+        from notifications_app.reminders import dispatch_due_reminders
+
+        now = timezone.now()
+        later = self.make_reminder('later', now - timedelta(minutes=1))
+        first = self.make_reminder('first', now - timedelta(minutes=5))
+        future = self.make_reminder('future', now + timedelta(minutes=5))
+
+        self.assertEqual(dispatch_due_reminders(batch_size=1, now=now), 1)
+        self.assertEqual(mock_apply.call_args.kwargs['task_id'], f'reminder-{first.pk}')
+        self.assertEqual(dispatch_due_reminders(batch_size=10, now=now), 1)
+        self.assertEqual(dispatch_due_reminders(batch_size=10, now=now), 0)
+
+        self.assertEqual(mock_apply.call_count, 2)
+        self.assertEqual(mock_apply.call_args.kwargs, {'args': [1], 'kwargs': {}, 'task_id': f'reminder-{later.pk}'})
+        future.refresh_from_db()
+        self.assertEqual(future.status, Reminder.PENDING)
+        self.assertEqual(Reminder.objects.filter(status=Reminder.DISPATCHED).count(), 2)
+
+    def test_unknown_task_fails_reminder(self):
+        """Test a reminder for an unregistered task is marked failed instead of blocking the queue"""
+        from notifications_app.models import Reminder
+        from notifications_app.reminders import dispatch_due_reminders
+
+        reminder = self.make_reminder('bad', timezone.now(), task='no.such.task')
+        self.assertEqual(dispatch_due_reminders(), 1)
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.status, Reminder.FAILED)
+
 
 class NotificationViewTest(TestCase):
     """Test notifications_app views"""
@@ -1,3 +1,63 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from .models import MailCheckpoint, MailDelivery, MailEvent, MailPayload, SuppressedRecipient
+from .suppression import suppress, unsuppress
+from .tasks import resume_checkpoint
+
+
+@admin.register(MailDelivery)
+class MailDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'campaign', 'status', 'status_code', 'modified')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'campaign', 'message_id')
+
+
+@admin.register(MailPayload)
+class MailPayloadAdmin(admin.ModelAdmin):
+    list_display = ('headline', 'recipient_count', 'created')
+    search_fields = ('headline',)
+
+
+@admin.register(MailCheckpoint)
+class MailCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('campaign', 'task_name', 'status', 'position', 'sent', 'failed', 'skipped', 'modified')
+    list_filter = ('status', 'task_name')
+    search_fields = ('campaign',)
+    actions = ['resume_sends']
+
+    @admin.action(description="Resume selected sends from their checkpoint (only if their worker died)")
+    def resume_sends(self, request, queryset):
+        checkpoints = queryset.filter(status=MailCheckpoint.RUNNING)
+        resumed = sum(resume_checkpoint(checkpoint) is not None for checkpoint in checkpoints)
+        self.message_user(request, f"Resumed {resumed} sends", messages.SUCCESS)
+        if resumed < len(checkpoints):
+            self.message_user(request, f"Skipped {len(checkpoints) - resumed} sends that are still running",
+                              messages.WARNING)
+
+
+@admin.register(MailEvent)
+class MailEventAdmin(admin.ModelAdmin):
+    list_display = ('email', 'event', 'hard_bounce', 'error', 'occurred_at')
+    list_filter = ('event',)
+    search_fields = ('email', 'message_id', 'custom_id')
+
+
+@admin.register(SuppressedRecipient)
+class SuppressedRecipientAdmin(admin.ModelAdmin):
+    list_display = ('email', 'reason', 'created')
+    list_filter = ('reason',)
+    search_fields = ('email',)
+
+    # Keep the Redis suppression set in step with the table
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        suppress(obj.email)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        unsuppress(obj.email)
+
+    def delete_queryset(self, request, queryset):
+        emails = list(queryset.values_list('email', flat=True))
+        super().delete_queryset(request, queryset)
+        unsuppress(*emails)
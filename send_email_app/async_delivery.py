@@ -0,0 +1,107 @@
+"""
+Concurrent delivery of Mailjet batches; the Mailjet transport does it over an
+asyncio HTTP client.
+
+A Celery worker slot sending batches one after the other spends most of its
+time waiting on the network. Here several Send API requests are kept in
+flight at once, bounded by a concurrency limit and a requests-per-second cap
+so the worker can run right up to the provider's rate limit. Each request
+also takes a token from the cluster-wide throttle shared with the other
+workers.
+"""
+import asyncio
+
+import httpx
+from django.conf import settings
+
+from .delivery import chunked, failed_results, get_batch_size, get_transport, parse_send_response
+from .mailjet_client import retry_after
+from .metrics import PROVIDER_REQUEST_SECONDS, transport_name
+from .throttle import get_mailjet_throttle
+
+
+class RateLimiter:
+    """Space out acquisitions so that at most ``rate`` happen per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            delay = max(0.0, self.next_slot - now)
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def send_batch_async(client, url, messages):
+    """Send one batch to the Mailjet Send API at ``url`` over an ``httpx.AsyncClient``."""
+    throttle = get_mailjet_throttle()
+    try:
+        await asyncio.to_thread(throttle.acquire)
+        response = await client.post(url, json={'Messages': messages})
+        if response.status_code == 429:
+            await asyncio.to_thread(throttle.backoff, retry_after(response))
+    except httpx.HTTPError as e:
+        return failed_results(messages, e)
+
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    return parse_send_response(messages, response.status_code, body)
+
+
+async def send_in_batches_async(messages, on_results=None, batch_size=None, concurrency=None, rate_limit=None,
+                                transport=None):
+    """
+    Send ``messages`` in Send API batches with up to ``concurrency`` requests
+    in flight and at most ``rate_limit`` requests started per second.
+
+    ``on_results`` is a synchronous callable invoked with each batch's results
+    as the batch completes. It runs in a worker thread so it may itself use
+    ``async_to_sync`` (as ``WebSocketProgressRecorder`` does). ``transport``
+    defaults to the one selected by EMAIL_TRANSPORT.
+    """
+    if concurrency is None:
+        concurrency = getattr(settings, 'MAIL_JET_ASYNC_CONCURRENCY', 10)
+    if rate_limit is None:
+        rate_limit = getattr(settings, 'MAIL_JET_REQUESTS_PER_SECOND', 10)
+    if transport is None:
+        transport = get_transport()
+
+    request_seconds = PROVIDER_REQUEST_SECONDS.labels(transport_name(transport))
+    limiter = RateLimiter(rate_limit)
+    slots = asyncio.Semaphore(concurrency)
+    callback_lock = asyncio.Lock()
+
+    async with transport.async_sender(concurrency) as send:
+
+        async def run(batch):
+            try:
+                await limiter.wait()
+                with request_seconds.time():
+                    results = await send(batch)
+            finally:
+                slots.release()
+            if on_results is not None:
+                async with callback_lock:
+                    await asyncio.to_thread(on_results, results)
+            return results
+
+        pending = []
+        batches = chunked(messages, get_batch_size(batch_size))
+        while True:
+            # Render lazily: only pull the next batch once a slot is free
+            await slots.acquire()
+            batch = next(batches, None)
+            if batch is None:
+                slots.release()
+                break
+            pending.append(asyncio.create_task(run(batch)))
+        return [result for results in await asyncio.gather(*pending) for result in results]
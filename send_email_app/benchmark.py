@@ -0,0 +1,183 @@
+"""
+Throughput benchmarks of the bulk-mail pipeline.
+
+Each scenario mails a list of generated recipients through the real code
+path (template rendering, batching, delivery ledger, progress reporting)
+with ``FakeTransport`` standing in for the provider, and reports
+messages/sec, per-message latency percentiles and memory. Results are plain
+dicts so they can be written as JSON and compared between releases with
+``find_regressions``.
+"""
+import platform
+import resource
+import time
+import tracemalloc
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+import django
+from django.conf import settings
+
+from . import delivery
+from .models import MailDelivery
+from .throttle import NoThrottle
+from .transports import EmailTransport, FakeTransport
+
+# Recipient counts run by default. One request per message makes single
+# sends the slowest, so they stop at 1000: at the default 0.2 s simulated
+# latency a default run takes about five minutes.
+DEFAULT_SIZES = {
+    'send_email_with_template': (100, 1000),
+    'send_mail_task': (100, 1000, 10000),
+    'async_send_mail_task': (100, 1000, 10000),
+}
+
+HEADLINE = 'Benchmark'
+CONTENT = 'Benchmark notification body.'
+
+
+class TimingTransport(EmailTransport):
+    """Wrap a transport and record how long each message took to go out."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.latencies = []
+
+    def record(self, started, batch):
+        self.latencies.extend([time.perf_counter() - started] * len(batch))
+
+    def send_batch(self, messages):
+        started = time.perf_counter()
+        results = self.transport.send_batch(messages)
+        self.record(started, messages)
+        return results
+
+    @asynccontextmanager
+    async def async_sender(self, concurrency):
+        async with self.transport.async_sender(concurrency) as send:
+
+            async def timed_send(messages):
+                started = time.perf_counter()
+                results = await send(messages)
+                self.record(started, messages)
+                return results
+
+            yield timed_send
+
+
+@contextmanager
+def use_transport(transport):
+    """Make ``transport`` the process-wide transport for the duration of the block."""
+    previous = delivery._transport
+    delivery._transport = transport
+    try:
+        yield transport
+    finally:
+        delivery._transport = previous
+
+
+def benchmark_recipients(count):
+    return [f'bench{i}@example.com' for i in range(count)]
+
+
+def run_send_email_with_template(emails, campaign):
+    from .tasks import send_email_with_template
+    for email in emails:
+        send_email_with_template(email, HEADLINE, 'notification_email', {'headline': HEADLINE, 'content': CONTENT})
+
+
+def run_send_mail_task(emails, campaign):
+    from .tasks import send_mail_task
+    send_mail_task.apply(args=(emails, HEADLINE, CONTENT), task_id=campaign, throw=True)
+
+
+def run_async_send_mail_task(emails, campaign):
+    from .tasks import async_send_mail_task
+    async_send_mail_task.apply(args=(emails, HEADLINE, CONTENT), task_id=campaign, throw=True)
+
+
+SCENARIOS = {
+    'send_email_with_template': run_send_email_with_template,
+    'send_mail_task': run_send_mail_task,
+    'async_send_mail_task': run_async_send_mail_task,
+}
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(percent / 100.0 * len(values)) - 1))]
+
+
+def run_benchmark(scenario, recipients, transport=None, trace_memory=False):
+    """
+    Run one scenario for ``recipients`` generated addresses and return its
+    measurements. ``transport`` defaults to an unthrottled ``FakeTransport``
+    configured from settings. Ledger rows written by the run are removed
+    afterwards.
+    """
+    timing = TimingTransport(transport or FakeTransport(throttle=NoThrottle()))
+    emails = benchmark_recipients(recipients)
+    campaign = f'benchmark-{uuid.uuid4()}'
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with use_transport(timing):
+            SCENARIOS[scenario](emails, campaign)
+        elapsed = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        MailDelivery.objects.filter(campaign=campaign).delete()
+
+    latencies = sorted(timing.latencies)
+    return {
+        'scenario': scenario,
+        'recipients': recipients,
+        'messages': len(latencies),
+        'seconds': round(elapsed, 4),
+        'messages_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p99': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        },
+        'peak_traced_memory_kb': peak_memory // 1024 if peak_memory is not None else None,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def environment():
+    """Settings that the numbers depend on, recorded next to the results."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'batch_size': delivery.get_batch_size(),
+        'async_concurrency': getattr(settings, 'MAIL_JET_ASYNC_CONCURRENCY', None),
+        'requests_per_second': getattr(settings, 'MAIL_JET_REQUESTS_PER_SECOND', None),
+        'rate_limit': getattr(settings, 'MAIL_JET_RATE_LIMIT', None),
+    }
+
+
+def find_regressions(results, baseline, tolerance=0.1):
+    """
+    Compare ``results`` against a previous run's results. Returns a message
+    for every scenario/size whose throughput dropped, or whose p99 latency
+    grew, by more than ``tolerance``.
+    """
+    previous = {(result['scenario'], result['recipients']): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['scenario'], result['recipients']))
+        if before is None:
+            continue
+        label = f"{result['scenario']} x {result['recipients']}"
+        if result['messages_per_second'] < before['messages_per_second'] * (1 - tolerance):
+            regressions.append(f"{label}: {result['messages_per_second']} msg/s, was {before['messages_per_second']}")
+        p99, p99_before = result['latency_ms']['p99'], before['latency_ms']['p99']
+        if p99 is not None and p99_before and p99 > p99_before * (1 + tolerance):
+            regressions.append(f"{label}: p99 {p99} ms, was {p99_before} ms")
+    return regressions
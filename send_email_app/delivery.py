@@ -0,0 +1,134 @@
+"""
+Batched delivery of rendered emails through the Mailjet v3.1 Send API.
+
+The Send API accepts up to 50 entries in its ``Messages`` array and answers
+with one status entry per message, in request order. Grouping recipients
+into such payloads turns one HTTP round trip per address into one per batch.
+The batches are handed to the transport configured by EMAIL_TRANSPORT (see
+``transports``), which speaks this format whatever it actually delivers with.
+"""
+from collections import namedtuple
+from itertools import islice
+
+import httpx
+import requests
+from django.conf import settings
+from urllib3.exceptions import ConnectTimeoutError
+from django.utils.module_loading import import_string
+
+from .metrics import PROVIDER_REQUEST_SECONDS, transport_name
+
+DEFAULT_EMAIL_TRANSPORT = 'send_email_app.transports.MailjetTransport'
+
+MAILJET_MAX_BATCH_SIZE = 50
+
+# ``connect_error`` is set when the request never reached the provider, so
+# that sending it again cannot deliver the message twice
+DeliveryResult = namedtuple('DeliveryResult', ['email', 'success', 'status_code', 'message_id', 'error',
+                                               'connect_error'], defaults=(False,))
+
+
+def get_batch_size(batch_size=None):
+    """Return the configured batch size, clamped to what Mailjet accepts."""
+    if batch_size is None:
+        batch_size = getattr(settings, 'MAIL_JET_BATCH_SIZE', MAILJET_MAX_BATCH_SIZE)
+    return max(1, min(int(batch_size), MAILJET_MAX_BATCH_SIZE))
+
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable`` without materialising it."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def message_recipient(message):
+    return message['To'][0]['Email']
+
+
+def is_connect_error(exc):
+    """
+    Whether ``exc`` was raised before the request reached the provider: the
+    connection could not be opened. Read timeouts and dropped connections
+    are not, the provider may have accepted the messages already.
+    """
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, requests.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        # Raised once urllib3 gave up; a connect failure is its reason (NewConnectionError is one)
+        return isinstance(getattr(exc.args[0], 'reason', exc.args[0]), ConnectTimeoutError)
+    return False
+
+
+def failed_results(messages, exc, connect_error=None):
+    """One failed DeliveryResult per message of a batch whose request raised ``exc``."""
+    print(f"Error sending batch of {len(messages)} emails: {str(exc)}")
+    if connect_error is None:
+        connect_error = is_connect_error(exc)
+    return [DeliveryResult(message_recipient(message), False, None, None, str(exc), connect_error)
+            for message in messages]
+
+
+def parse_send_response(messages, status_code, body):
+    """
+    Map the per-message statuses of a Send API response back to recipients.
+
+    Mailjet returns the ``Messages`` array in the order the messages were
+    submitted. When the response carries no usable per-message data (auth
+    failure, 5xx, rate limiting) every message of the batch is reported as
+    failed with the HTTP status code.
+    """
+    entries = body.get('Messages') if isinstance(body, dict) else None
+    if not entries or len(entries) != len(messages):
+        error = body.get('ErrorMessage') if isinstance(body, dict) else None
+        return [
+            DeliveryResult(message_recipient(message), False, status_code, None, error or f"HTTP {status_code}")
+            for message in messages
+        ]
+
+    results = []
+    for message, entry in zip(messages, entries):
+        email = message_recipient(message)
+        if entry.get('Status') == 'success':
+            to = entry.get('To') or [{}]
+            results.append(DeliveryResult(email, True, status_code, to[0].get('MessageUUID'), None))
+        else:
+            errors = entry.get('Errors') or [{}]
+            results.append(DeliveryResult(
+                email, False, errors[0].get('StatusCode', status_code), None, errors[0].get('ErrorMessage')
+            ))
+    return results
+
+
+_transport = None
+
+
+def get_transport():
+    """Return the process-wide transport selected by the EMAIL_TRANSPORT setting."""
+    global _transport
+    if _transport is None:
+        _transport = import_string(getattr(settings, 'EMAIL_TRANSPORT', DEFAULT_EMAIL_TRANSPORT))()
+    return _transport
+
+
+def send_batch(messages, transport=None):
+    """Send up to ``MAILJET_MAX_BATCH_SIZE`` messages in one transport call."""
+    if len(messages) > MAILJET_MAX_BATCH_SIZE:
+        raise ValueError(f"Mailjet accepts at most {MAILJET_MAX_BATCH_SIZE} messages per request")
+    transport = transport or get_transport()
+    with PROVIDER_REQUEST_SECONDS.labels(transport_name(transport)).time():
+        return transport.send_batch(messages)
+
+
+def send_in_batches(messages, batch_size=None, transport=None):
+    """
+    Send an iterable of messages in batches, yielding each batch's results.
+
+    ``messages`` is consumed lazily, so a generator that renders messages on
+    demand only ever holds one batch worth of rendered HTML in memory.
+    """
+    for batch in chunked(messages, get_batch_size(batch_size)):
+        yield send_batch(batch, transport)
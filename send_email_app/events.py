@@ -0,0 +1,79 @@
+"""
+Ingestion of Mailjet event webhooks.
+
+Mailjet posts one event per request, or a JSON array of them when event
+grouping is enabled for the callback URL. A batch is stored with one bulk
+INSERT, and the addresses it shows to be unmailable are added to the
+SuppressedRecipient table and the Redis suppression set in one go, so the
+next bulk send skips them before rendering.
+"""
+from datetime import datetime, timezone
+
+from .models import MailEvent, SuppressedRecipient
+from .suppression import normalise, suppress
+
+# Rows per INSERT
+INSERT_SIZE = 1000
+
+# Events after which an address is suppressed; a bounce only when it is hard
+SUPPRESSING_EVENTS = ('bounce', 'blocked', 'spam', 'unsub')
+
+
+def suppression_reason(event):
+    """The reason to suppress the address of ``event``, or None."""
+    name = event.get('event')
+    if name not in SUPPRESSING_EVENTS:
+        return None
+    if name == 'bounce' and not event.get('hard_bounce'):
+        return None
+    return name
+
+
+def mail_event(event):
+    """The MailEvent for one Mailjet event dict, or None if it is unusable."""
+    try:
+        email = normalise(event['email'])
+        occurred_at = datetime.fromtimestamp(int(event['time']), tz=timezone.utc)
+        name = str(event['event'])[:20]
+    except (KeyError, TypeError, ValueError, AttributeError, OverflowError, OSError):
+        return None
+    error = ': '.join(str(part) for part in (event.get('error_related_to'), event.get('error')) if part)
+    return MailEvent(
+        event=name,
+        email=email,
+        message_id=str(event.get('MessageID') or event.get('mj_message_id') or '')[:64],
+        custom_id=str(event.get('CustomID') or '')[:255],
+        occurred_at=occurred_at,
+        hard_bounce=event.get('hard_bounce'),
+        error=error[:255],
+    )
+
+
+def ingest_events(events):
+    """
+    Store a batch of Mailjet event dicts and suppress the addresses that
+    hard bounced, were blocked, complained or unsubscribed. Returns the
+    number of events stored and of addresses suppressed.
+    """
+    rows = []
+    suppressions = {}
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        row = mail_event(event)
+        if row is None:
+            continue
+        rows.append(row)
+        reason = suppression_reason(event)
+        if reason is not None:
+            suppressions.setdefault(row.email, reason)
+
+    MailEvent.objects.bulk_create(rows, batch_size=INSERT_SIZE, ignore_conflicts=True)
+    if suppressions:
+        SuppressedRecipient.objects.bulk_create(
+            [SuppressedRecipient(email=email, reason=reason) for email, reason in suppressions.items()],
+            batch_size=INSERT_SIZE,
+            ignore_conflicts=True,
+        )
+        suppress(*suppressions)
+    return len(rows), len(suppressions)
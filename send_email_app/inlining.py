@@ -0,0 +1,219 @@
+"""
+CSS inlining of the email templates, done once per template version.
+
+Many mail clients ignore ``<style>`` blocks, so the rules of the layout are
+copied into ``style`` attributes. Inlining parses the whole document, which
+is far too slow for every send, so it is applied to the template *source*:
+an email template is flattened with the layout it extends into one template,
+its styles are inlined, and the result is stored under
+``EMAIL_TEMPLATE_CACHE_DIR`` keyed by a hash of the sources. Sends then only
+render that flat template. ``manage.py build_email_templates`` fills the
+cache at deploy time; a template missing from it is inlined on first use.
+
+The ``<style>`` block is kept as it is for the clients that do support it,
+for ``@media`` and ``:hover`` rules, and for the HTML passed in as content.
+Template tags, variables and comments are swapped for placeholders while
+the HTML is parsed, so the parser cannot escape the ``<``, ``>`` and ``&``
+inside them.
+"""
+import hashlib
+import os
+import re
+
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.template import engines
+from django.template.loader import get_template
+
+# Bump to invalidate every cached template when the inliner changes
+INLINER_VERSION = '2'
+
+COMMENT = re.compile(r'/\*.*?\*/', re.S)
+EXTENDS = re.compile(r'{%\s*extends\s+["\']([^"\']+)["\']\s*%}')
+LOAD = re.compile(r'{%\s*load\s[^%]*%}')
+BLOCK = re.compile(r'{%\s*block\s+(\w+)\s*%}(.*?){%\s*endblock(?:\s+\w+)?\s*%}', re.S)
+BLOCK_SUPER = re.compile(r'{{\s*block\.super\s*}}')
+TEMPLATE_SYNTAX = re.compile(r'{%.*?%}|{{.*?}}|{#.*?#}', re.S)
+# A tag used as an attribute (<p {% if a %}hidden{% endif %}>) comes back as a valueless attribute
+PLACEHOLDER = re.compile(r'clockworktag(\d+)x(?:="")?')
+
+SPECIFICITY_IDS = re.compile(r'#[\w-]+')
+SPECIFICITY_CLASSES = re.compile(r'\.[\w-]+|\[[^\]]*\]')
+SPECIFICITY_ELEMENTS = re.compile(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)')
+
+
+def parse_declarations(css):
+    """Return ``[(property, value, important)]`` for a declaration block."""
+    declarations = []
+    for declaration in css.split(';'):
+        prop, sep, value = declaration.partition(':')
+        prop, value = prop.strip().lower(), value.strip()
+        if not sep or not prop or not value:
+            continue
+        important = value.lower().endswith('!important')
+        declarations.append((prop, value, important))
+    return declarations
+
+
+def parse_stylesheet(css):
+    """
+    Return the ``(selector, declarations)`` rules of ``css`` in source order.
+    At-rules such as ``@media`` are skipped, they cannot be inlined.
+    """
+    css = COMMENT.sub('', css)
+    rules, pos = [], 0
+    while True:
+        start = css.find('{', pos)
+        if start == -1:
+            return rules
+        depth, end = 1, start + 1
+        while depth and end < len(css):
+            depth += {'{': 1, '}': -1}.get(css[end], 0)
+            end += 1
+        prelude = css[pos:start].strip()
+        if not prelude.startswith('@'):
+            rules.append((prelude, parse_declarations(css[start + 1:end - 1])))
+        pos = end
+
+
+def specificity(selector):
+    return (
+        len(SPECIFICITY_IDS.findall(selector)),
+        len(SPECIFICITY_CLASSES.findall(selector)),
+        len(SPECIFICITY_ELEMENTS.findall(selector)),
+    )
+
+
+def inline_css(html):
+    """
+    Copy the rules of the ``<style>`` blocks of ``html`` into the ``style``
+    attribute of every element they match, following the cascade. Rules
+    with pseudo-classes or pseudo-elements are left to the style block.
+    ``html`` may be a Django template, its tags are kept verbatim.
+    """
+    tags = []
+
+    def protect(match):
+        tags.append(match.group(0))
+        return f'clockworktag{len(tags) - 1}x'
+
+    soup = BeautifulSoup(TEMPLATE_SYNTAX.sub(protect, html), 'html.parser')
+    matched = {}
+    order = 0
+    for style in soup.find_all('style'):
+        for selectors, declarations in parse_stylesheet(style.string or ''):
+            for selector in selectors.split(','):
+                selector = selector.strip()
+                if not selector or ':' in selector:
+                    continue
+                weight = specificity(selector)
+                for element in soup.select(selector):
+                    for prop, value, important in declarations:
+                        order += 1
+                        matched.setdefault(id(element), (element, []))[1].append(
+                            ((important, (0,) + weight, order), prop, value)
+                        )
+
+    for element, candidates in matched.values():
+        # Existing inline styles beat any selector unless a rule is !important
+        for prop, value, important in parse_declarations(element.get('style', '')):
+            order += 1
+            candidates.append(((important, (1, 0, 0, 0), order), prop, value))
+        winners = {}
+        for key, prop, value in candidates:
+            if prop not in winners or key >= winners[prop][0]:
+                winners[prop] = (key, value)
+        declarations = sorted(winners.items(), key=lambda item: item[1][0][2])
+        element['style'] = '; '.join(f'{prop}: {value}' for prop, (_, value) in declarations)
+    return PLACEHOLDER.sub(lambda match: tags[int(match.group(1))], str(soup))
+
+
+def template_source(name):
+    return get_template(name).template.source
+
+
+def flatten_template(name):
+    """
+    Return the source of template ``name`` with its ``{% extends %}`` chain
+    resolved into one template, plus the chain of template names.
+
+    Only templates whose blocks are not nested can be flattened; others
+    raise ValueError.
+    """
+    source = template_source(name)
+    extends = EXTENDS.search(source)
+    if extends is None:
+        return source, [name]
+    parent_source, chain = flatten_template(extends.group(1))
+    blocks = {}
+    for block, content in BLOCK.findall(source):
+        if '{% block' in content or '{%block' in content:
+            raise ValueError(f"{name} has nested blocks")
+        blocks[block] = content
+
+    def fill(match):
+        block, default = match.group(1), match.group(2)
+        if '{% block' in default or '{%block' in default:
+            raise ValueError(f"{chain[0]} has nested blocks")
+        content = BLOCK_SUPER.sub(lambda _: default, blocks[block]) if block in blocks else default
+        # Keep the block tags, so a template further down the chain can still override it
+        return f'{{% block {block} %}}{content}{{% endblock %}}'
+
+    flat = BLOCK.sub(fill, parent_source)
+    loads = ''.join(LOAD.findall(source))
+    return loads + flat, [name] + chain
+
+
+def template_key(name):
+    """Return the flattened source of ``name`` and a hash identifying it."""
+    source, chain = flatten_template(name)
+    digest = hashlib.sha256(INLINER_VERSION.encode())
+    for template in chain:
+        digest.update(template_source(template).encode())
+    return source, digest.hexdigest()[:16]
+
+
+def cache_path(name, key):
+    return os.path.join(settings.EMAIL_TEMPLATE_CACHE_DIR, f"{name.replace('/', '__')}.{key}")
+
+
+def build_inlined_source(name):
+    """
+    Return the inlined source of template ``name``, reading it from the
+    cache directory or inlining and storing it there, and its cache path.
+    """
+    source, key = template_key(name)
+    path = cache_path(name, key)
+    try:
+        with open(path, encoding='utf-8') as cached:
+            return cached.read(), path
+    except FileNotFoundError:
+        pass
+    inlined = inline_css(source)
+    # Never cache a template that does not compile
+    engines['django'].from_string(inlined)
+    try:
+        os.makedirs(settings.EMAIL_TEMPLATE_CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as cached:
+            cached.write(inlined)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache inlined email template {name}: {e}")
+    return inlined, path
+
+
+def inlined_template(name):
+    """Return the compiled CSS-inlined version of template ``name``."""
+    source, _ = build_inlined_source(name)
+    return engines['django'].from_string(source)
+
+
+def email_template_names():
+    """Names of the ``emails/*.html`` templates in the template directories."""
+    names = set()
+    for directory in engines['django'].template_dirs:
+        emails_dir = os.path.join(directory, 'emails')
+        if os.path.isdir(emails_dir):
+            names.update(f'emails/{file}' for file in os.listdir(emails_dir) if file.endswith('.html'))
+    return sorted(names)
@@ -0,0 +1,88 @@
+"""
+Idempotent delivery bookkeeping for the bulk mail tasks.
+
+Tasks consult the ledger before sending and record every batch's results
+right after the provider answers, so a retried or redelivered task only
+sends to the recipients that have not been mailed yet. Rows are only
+needed while a campaign may still be retried, so ``purge_deliveries``
+deletes them after MAIL_DELIVERY_RETENTION_DAYS.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import MailDelivery
+
+# Recipients per ``recipient__in`` lookup
+LOOKUP_SIZE = 500
+
+# Provider answers that reject a request without accepting any of it, so a
+# retry may succeed and cannot mail anyone twice. Other 5xx answers, like
+# read timeouts, are ambiguous (see mailjet_client.RETRY_STATUS_CODES).
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+def custom_id(campaign, recipient):
+    """Stable Mailjet CustomID for one recipient of one campaign."""
+    return hashlib.sha1(f"{campaign}:{recipient}".encode()).hexdigest()
+
+
+def delivered_recipients(campaign, recipients):
+    """Return the subset of ``recipients`` already sent in ``campaign``."""
+    recipients = list(recipients)
+    delivered = set()
+    for start in range(0, len(recipients), LOOKUP_SIZE):
+        delivered.update(MailDelivery.objects.filter(
+            campaign=campaign,
+            status=MailDelivery.SENT,
+            recipient__in=recipients[start:start + LOOKUP_SIZE],
+        ).values_list('recipient', flat=True))
+    return delivered
+
+
+def record_results(campaign, results):
+    """Upsert one ledger row per DeliveryResult in a single query."""
+    # An upsert may not touch the same row twice, so keep one result per recipient
+    latest = {result.email: result for result in results}
+    MailDelivery.objects.bulk_create(
+        [
+            MailDelivery(
+                campaign=campaign,
+                recipient=result.email,
+                status=MailDelivery.SENT if result.success else MailDelivery.FAILED,
+                status_code=result.status_code,
+                message_id=result.message_id or '',
+                error=result.error or '',
+            )
+            for result in latest.values()
+        ],
+        update_conflicts=True,
+        unique_fields=['campaign', 'recipient'],
+        update_fields=['status', 'status_code', 'message_id', 'error', 'modified'],
+    )
+
+
+def is_retryable(result):
+    """
+    Whether a failed delivery may be sent again: the connection could not be
+    opened, or the provider answered 429 or 503. Ambiguous failures stay
+    FAILED in the ledger and are not retried.
+    """
+    if result.success:
+        return False
+    return result.connect_error or result.status_code in RETRYABLE_STATUS_CODES
+
+
+class RetryableDeliveryError(Exception):
+    """Some messages failed with transient errors; retrying the task resends only those."""
+
+
+def purge_deliveries(retention_days=None):
+    """Delete ledger rows older than MAIL_DELIVERY_RETENTION_DAYS; returns how many."""
+    if retention_days is None:
+        retention_days = getattr(settings, 'MAIL_DELIVERY_RETENTION_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = MailDelivery.objects.filter(created__lt=cutoff).delete()
+    return deleted
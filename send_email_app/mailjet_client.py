@@ -0,0 +1,127 @@
+"""
+Shared Mailjet Send API client for every mail path in the project.
+
+``mailjet_rest.Client`` issues each call through a bare ``requests.post``, so
+every email pays for a fresh TCP connection and TLS handshake. This client
+keeps one pooled keep-alive ``requests.Session`` per process instead, with
+timeouts and retry/backoff for responses that guarantee nothing was sent.
+Every request first takes a token from the cluster-wide throttle.
+"""
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.compat import urljoin
+from urllib3.util.retry import Retry
+
+from .throttle import get_mailjet_throttle
+
+MAILJET_API_URL = 'https://api.mailjet.com/'
+
+# Only retry when Mailjet rejected the request outright; a read timeout or a
+# 5xx from a proxy may mean the messages were already accepted. 429s are
+# retried by MailjetClient.send so the shared throttle can react to them.
+RETRY_STATUS_CODES = (503,)
+
+
+def retry_after(response):
+    """Seconds from a Retry-After header, or None."""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class MailjetClient:
+    """Mailjet v3.1 Send API client on a pooled, keep-alive HTTP session."""
+
+    def __init__(self, api_key, api_secret, api_url=MAILJET_API_URL, timeout=(5, 30), pool_size=10,
+                 max_retries=3, backoff_factor=0.5):
+        self.auth = (api_key, api_secret)
+        self.send_url = urljoin(api_url, 'v3.1/send')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def build_session(self):
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=self.max_retries,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset({'POST'}),
+            backoff_factor=self.backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry, pool_block=True)
+        session = requests.Session()
+        session.auth = self.auth
+        session.headers.update({'Content-Type': 'application/json', 'User-Agent': 'clock_work-mailjet'})
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """
+        The process-wide session. Celery prefork children inherit the parent's
+        sockets, so a new session is built whenever the pid changes.
+        """
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self.build_session()
+                    self._session_pid = pid
+        return self._session
+
+    def send(self, data):
+        """
+        POST a Send API payload (``{'Messages': [...]}``) and return the response.
+
+        A 429 slows the shared throttle down and the request is tried again,
+        up to ``max_retries`` times, after the advertised Retry-After or an
+        exponential backoff.
+        """
+        throttle = get_mailjet_throttle()
+        for attempt in range(self.max_retries + 1):
+            throttle.acquire()
+            response = self.session.post(self.send_url, json=data, timeout=self.timeout)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            delay = retry_after(response)
+            throttle.backoff(delay)
+            time.sleep(delay or self.backoff_factor * (2 ** attempt))
+
+    def close(self):
+        if self._session is not None and self._session_pid == os.getpid():
+            self._session.close()
+        self._session = None
+
+
+_client = None
+
+
+def get_mailjet_client():
+    """Return the shared MailjetClient configured from settings."""
+    global _client
+    if _client is None:
+        _client = MailjetClient(
+            settings.MAIL_JET_API_KEY,
+            settings.MAIL_JET_API_SECRET,
+            api_url=getattr(settings, 'MAIL_JET_API_URL', MAILJET_API_URL),
+            timeout=(getattr(settings, 'MAIL_JET_CONNECT_TIMEOUT', 5), getattr(settings, 'MAIL_JET_READ_TIMEOUT', 30)),
+            pool_size=getattr(settings, 'MAIL_JET_POOL_SIZE', 10),
+            max_retries=getattr(settings, 'MAIL_JET_MAX_RETRIES', 3),
+            backoff_factor=getattr(settings, 'MAIL_JET_RETRY_BACKOFF', 0.5),
+        )
+    return _client
@@ -0,0 +1,90 @@
+# send_email_app/management/commands/benchmark_email.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from send_email_app.benchmark import DEFAULT_SIZES, SCENARIOS, environment, find_regressions, run_benchmark
+from send_email_app.throttle import NoThrottle
+from send_email_app.transports import FakeTransport
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the bulk-mail pipeline against a fake email provider and write the results as JSON. '
+        'The default run takes about five minutes at the default 0.2 s simulated latency; '
+        'the fake provider is not rate limited unless --throttle is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            nargs='+',
+            choices=sorted(SCENARIOS),
+            default=sorted(SCENARIOS),
+            help='Scenarios to run (default: all)'
+        )
+        parser.add_argument(
+            '--recipients',
+            nargs='+',
+            type=int,
+            help='Recipient counts to run every scenario with (default: 100, 1000 and 10000, '
+                 'single sends only up to 1000)'
+        )
+        parser.add_argument(
+            '--throttle',
+            action='store_true',
+            help='Rate limit the fake provider like Mailjet (MAIL_JET_RATE_LIMIT, in its own Redis bucket)'
+        )
+        parser.add_argument('--latency', type=float, help='Simulated seconds per provider request')
+        parser.add_argument('--error-rate', type=float, help='Probability of a message failing')
+        parser.add_argument('--rate-limited-rate', type=float, help='Probability of a request getting a 429')
+        parser.add_argument('--seed', type=int, help='Random seed for the fake provider')
+        parser.add_argument(
+            '--trace-memory',
+            action='store_true',
+            help='Record peak Python allocations with tracemalloc (slows the run down)'
+        )
+        parser.add_argument('--output', metavar='FILE', help='Write the JSON report here instead of stdout')
+        parser.add_argument('--baseline', metavar='FILE', help='Fail if results regressed against this JSON report')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.1,
+            help='Allowed relative regression against the baseline (default: 0.1)'
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for scenario in options['scenario']:
+            for recipients in options['recipients'] or DEFAULT_SIZES[scenario]:
+                self.stderr.write(f'Running {scenario} with {recipients} recipients...')
+                transport = FakeTransport(
+                    latency=options['latency'],
+                    error_rate=options['error_rate'],
+                    rate_limited_rate=options['rate_limited_rate'],
+                    seed=options['seed'],
+                    throttle=None if options['throttle'] else NoThrottle(),
+                )
+                result = run_benchmark(scenario, recipients, transport, trace_memory=options['trace_memory'])
+                self.stderr.write(
+                    f"  {result['messages_per_second']} msg/s, "
+                    f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms"
+                )
+                results.append(result)
+
+        report = json.dumps({'environment': environment(), 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+            regressions = find_regressions(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,38 @@
+# send_email_app/management/commands/build_email_templates.py
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import TemplateSyntaxError
+
+from send_email_app.inlining import build_inlined_source, email_template_names
+
+
+class Command(BaseCommand):
+    help = 'Inline the CSS of the email templates and cache the results, so sends only render them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('templates', nargs='*', help='Templates to build (default: every emails/*.html)')
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete cached templates that were not built by this run'
+        )
+
+    def handle(self, *args, **options):
+        built = set()
+        for name in options['templates'] or email_template_names():
+            try:
+                _, path = build_inlined_source(name)
+            except (ValueError, TemplateSyntaxError) as e:
+                self.stderr.write(self.style.WARNING(f'Skipped {name}: {e}'))
+                continue
+            built.add(os.path.basename(path))
+            self.stdout.write(f'{name} -> {path}')
+
+        if options['prune'] and os.path.isdir(settings.EMAIL_TEMPLATE_CACHE_DIR):
+            for file in os.listdir(settings.EMAIL_TEMPLATE_CACHE_DIR):
+                if file not in built:
+                    os.remove(os.path.join(settings.EMAIL_TEMPLATE_CACHE_DIR, file))
+        self.stdout.write(self.style.SUCCESS(f'Built {len(built)} email templates'))
@@ -0,0 +1,15 @@
+# send_email_app/management/commands/rebuild_suppression_index.py
+
+from django.core.management.base import BaseCommand
+
+from send_email_app.models import SuppressedRecipient
+from send_email_app.suppression import replace_suppressions
+
+
+class Command(BaseCommand):
+    help = 'Reload the Redis suppression set from the SuppressedRecipient table'
+
+    def handle(self, *args, **options):
+        emails = SuppressedRecipient.objects.values_list('email', flat=True).iterator(chunk_size=2000)
+        count = replace_suppressions(emails)
+        self.stdout.write(self.style.SUCCESS(f'Loaded {count} suppressed addresses'))
@@ -0,0 +1,69 @@
+"""
+Prometheus metrics for the mail pipeline.
+
+Every process records into prometheus_client's default registry. With
+PROMETHEUS_MULTIPROC_DIR set (supervisord sets it for the web process and
+the workers) each process writes its samples to that directory and the
+``/metrics/`` view aggregates them.
+"""
+from celery import current_task
+from celery.signals import task_retry
+from prometheus_client import Counter, Histogram
+
+# Tasks whose retries and recipient counts are recorded
+MAIL_TASK_PREFIXES = ('clock_work.send_email_app.', 'clock_work.account.')
+
+RECIPIENT_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, float('inf'))
+
+RENDER_SECONDS = Histogram(
+    'clock_work_email_render_seconds',
+    'Time spent rendering an email template',
+    ['template'],
+)
+PROVIDER_REQUEST_SECONDS = Histogram(
+    'clock_work_email_provider_request_seconds',
+    'Time spent in one call to the email transport (one batch of messages)',
+    ['transport'],
+)
+MESSAGES = Counter(
+    'clock_work_email_messages',
+    'Messages handed to the email transport, by outcome and provider status code',
+    ['template', 'status', 'status_code'],
+)
+TASK_RETRIES = Counter(
+    'clock_work_email_task_retries',
+    'Retries of mail tasks',
+    ['task'],
+)
+TASK_RECIPIENTS = Histogram(
+    'clock_work_email_task_recipients',
+    'Recipients handled per mail task run',
+    ['task'],
+    buckets=RECIPIENT_BUCKETS,
+)
+
+
+def transport_name(transport):
+    return type(transport).__name__
+
+
+def count_results(results, template):
+    """Count a batch of DeliveryResults under ``template``."""
+    for result in results:
+        MESSAGES.labels(
+            template,
+            'sent' if result.success else 'failed',
+            str(result.status_code) if result.status_code is not None else 'none',
+        ).inc()
+
+
+def observe_task_recipients(count):
+    """Record the recipient count of the mail task currently running, if any."""
+    if current_task and current_task.name.startswith(MAIL_TASK_PREFIXES):
+        TASK_RECIPIENTS.labels(current_task.name).observe(count)
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    if sender is not None and sender.name.startswith(MAIL_TASK_PREFIXES):
+        TASK_RETRIES.labels(sender.name).inc()
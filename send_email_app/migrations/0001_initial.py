@@ -0,0 +1,36 @@
+# Generated by Django 4.2.28 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('campaign', models.CharField(max_length=255)),
+                ('recipient', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed')], max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('message_id', models.CharField(blank=True, default='', max_length=64)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name_plural': 'mail deliveries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='maildelivery',
+            constraint=models.UniqueConstraint(fields=('campaign', 'recipient'), name='unique_delivery_per_campaign'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.28 on 2026-10-18 08:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('send_email_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailPayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('headline', models.CharField(max_length=255)),
+                ('content', models.TextField()),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MailPayloadRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('payload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='send_email_app.mailpayload')),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.28 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('send_email_app', '0002_mail_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('campaign', models.CharField(max_length=255, unique=True)),
+                ('task_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed')], default='running', max_length=10)),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('payload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='send_email_app.mailpayload')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.28 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('send_email_app', '0003_mail_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('event', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('message_id', models.CharField(blank=True, default='', max_length=64)),
+                ('custom_id', models.CharField(blank=True, default='', max_length=255)),
+                ('occurred_at', models.DateTimeField()),
+                ('hard_bounce', models.BooleanField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SuppressedRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('reason', models.CharField(max_length=20)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mailevent',
+            constraint=models.UniqueConstraint(fields=('event', 'email', 'message_id', 'occurred_at'), name='unique_mail_event'),
+        ),
+    ]
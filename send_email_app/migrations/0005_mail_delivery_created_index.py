@@ -0,0 +1,17 @@
+# Generated by Django 4.2.28 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('send_email_app', '0004_mail_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='maildelivery',
+            index=models.Index(fields=['created'], name='maildelivery_created'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.28 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('send_email_app', '0005_mail_delivery_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailcheckpoint',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mailcheckpoint',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
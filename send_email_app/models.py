@@ -1,3 +1,196 @@
-from django.db import models
+from datetime import timedelta
 
-# Create your models here.
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from clock_work.models import AbstractBaseModel
+
+
+class CheckpointBusy(Exception):
+    """Another run of the send holds the checkpoint."""
+
+
+class MailDelivery(AbstractBaseModel):
+    """
+    Delivery ledger: one row per (campaign, recipient).
+
+    A campaign is the id of the Celery task doing the send, which stays the
+    same across retries and acks_late redeliveries, so a re-run can skip the
+    recipients that already went out.
+    """
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    campaign = models.CharField(max_length=255)
+    recipient = models.EmailField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    message_id = models.CharField(max_length=64, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'recipient'], name='unique_delivery_per_campaign'),
+        ]
+        indexes = [
+            # Used by the daily retention purge
+            models.Index(fields=['created'], name='maildelivery_created'),
+        ]
+        verbose_name_plural = 'mail deliveries'
+
+    def __str__(self):
+        return f"{self.recipient} ({self.status}) in {self.campaign}"
+
+
+class MailPayload(AbstractBaseModel):
+    """
+    Headline, body and recipient list of a notification send.
+
+    Stored out of band so that the broker message (or the PeriodicTask row of
+    a scheduled send) only carries the payload id, however many recipients
+    there are.
+    """
+    headline = models.CharField(max_length=255)
+    content = models.TextField()
+    recipient_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.headline} ({self.recipient_count} recipients)"
+
+
+class MailPayloadRecipient(models.Model):
+    """
+    One recipient of a MailPayload. Kept to the bare columns (no
+    AbstractBaseModel timestamps) since a payload can hold many thousands.
+    """
+    payload = models.ForeignKey(MailPayload, on_delete=models.CASCADE, related_name='recipients')
+    email = models.EmailField(max_length=254)
+
+    def __str__(self):
+        return self.email
+
+
+class MailCheckpoint(AbstractBaseModel):
+    """
+    Progress of a bulk send of a MailPayload, saved every
+    MAIL_CHECKPOINT_INTERVAL recipients.
+
+    ``campaign`` is the id of the sending task. The first ``position``
+    recipients of the payload have been handled, with the given counts, so a
+    redelivered or resumed run of the task continues from there.
+
+    Only one run advances a checkpoint: a run ``claim``s it as its ``owner``
+    and refreshes ``heartbeat`` whenever it saves progress. Another run may
+    only take over once the heartbeat is older than
+    MAIL_CHECKPOINT_STALE_SECONDS, and the previous owner's next save then
+    raises CheckpointBusy.
+    """
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    STATUS_CHOICES = (
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+    )
+
+    campaign = models.CharField(max_length=255, unique=True)
+    task_name = models.CharField(max_length=255)
+    payload = models.ForeignKey(MailPayload, on_delete=models.CASCADE, related_name='checkpoints')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    position = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    owner = models.CharField(max_length=255, blank=True, default='')
+    heartbeat = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.campaign} ({self.status}, {self.position} of {self.payload.recipient_count})"
+
+    @classmethod
+    def claim(cls, campaign, task_name, payload_id, owner):
+        """
+        Return the checkpoint of ``campaign``, created if needed, with
+        ``owner`` as its running owner unless the send is completed. Raises
+        CheckpointBusy while another owner's heartbeat is fresh.
+        """
+        with transaction.atomic():
+            checkpoint, _ = cls.objects.select_for_update().get_or_create(
+                campaign=campaign, defaults={'task_name': task_name, 'payload_id': payload_id}
+            )
+            if checkpoint.status == cls.COMPLETED:
+                return checkpoint
+            if checkpoint.owner and checkpoint.owner != owner and not checkpoint.is_stale():
+                raise CheckpointBusy(f"{campaign} is being sent by {checkpoint.owner}")
+            checkpoint.owner, checkpoint.heartbeat = owner, timezone.now()
+            checkpoint.save(update_fields=['owner', 'heartbeat', 'modified'])
+        return checkpoint
+
+    def is_stale(self):
+        """Whether the owner has not shown signs of life for MAIL_CHECKPOINT_STALE_SECONDS."""
+        stale_after = timedelta(seconds=getattr(settings, 'MAIL_CHECKPOINT_STALE_SECONDS', 300))
+        return self.heartbeat is None or self.heartbeat < timezone.now() - stale_after
+
+    def touch(self):
+        """Refresh the heartbeat; raises CheckpointBusy if another run has taken the checkpoint over."""
+        self.heartbeat = timezone.now()
+        if not type(self).objects.filter(pk=self.pk, owner=self.owner).update(heartbeat=self.heartbeat):
+            raise CheckpointBusy(f"{self.campaign} was taken over by another run")
+
+    def save_progress(self, report, status=None):
+        """
+        Store the counts of a DeliveryReport as the new checkpoint and
+        refresh the heartbeat. Raises CheckpointBusy if another run has
+        taken the checkpoint over.
+        """
+        self.position = report.done
+        self.sent, self.failed, self.skipped = report.sent, report.failed, report.skipped
+        if status is not None:
+            self.status = status
+        self.heartbeat = self.modified = timezone.now()
+        updated = type(self).objects.filter(pk=self.pk, owner=self.owner).update(
+            position=self.position, sent=self.sent, failed=self.failed, skipped=self.skipped, status=self.status,
+            heartbeat=self.heartbeat, modified=self.modified,
+        )
+        if not updated:
+            raise CheckpointBusy(f"{self.campaign} was taken over by another run")
+
+
+class MailEvent(AbstractBaseModel):
+    """
+    One Mailjet event (bounce, spam complaint, unsubscribe, ...) received by
+    the event webhook. Mailjet may deliver an event more than once, so
+    events are unique on their identifying fields.
+    """
+    event = models.CharField(max_length=20)
+    email = models.EmailField(max_length=254)
+    message_id = models.CharField(max_length=64, blank=True, default='')
+    custom_id = models.CharField(max_length=255, blank=True, default='')
+    occurred_at = models.DateTimeField()
+    hard_bounce = models.BooleanField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'email', 'message_id', 'occurred_at'],
+                                    name='unique_mail_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for {self.email} at {self.occurred_at}"
+
+
+class SuppressedRecipient(AbstractBaseModel):
+    """
+    An address that must not be mailed any more, with the event that put it
+    there. The Redis suppression set (see ``suppression``) indexes this table.
+    """
+    email = models.EmailField(max_length=254, unique=True)
+    reason = models.CharField(max_length=20)
+
+    def __str__(self):
+        return f"{self.email} ({self.reason})"
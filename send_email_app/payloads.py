@@ -0,0 +1,111 @@
+"""
+Out-of-band storage for notification payloads.
+
+Enqueueing ``send_mail_task(emails, headline, content)`` puts the whole
+recipient list and body into the JSON broker message, and a scheduled send
+keeps the same blob in ``PeriodicTask.args``. Instead the payload is stored
+once as a MailPayload and tasks receive ``payload_id``, streaming the
+recipients back page by page.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, IntegerField, OuterRef, Q
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
+from notifications_app.models import Reminder
+
+from .models import MailPayload, MailPayloadRecipient
+
+# Rows per INSERT when storing recipients, and per SELECT when streaming them
+INSERT_SIZE = 1000
+FETCH_SIZE = 2000
+
+
+def store_payload(emails, headline, content):
+    """Store a notification payload and return the MailPayload."""
+    return store_payloads([(emails, headline, content)])[0]
+
+
+def store_payloads(payloads):
+    """
+    Store a list of ``(emails, headline, content)`` payloads with one INSERT
+    for the payloads and batched INSERTs for all their recipients. Returns
+    the MailPayloads, in order.
+    """
+    with transaction.atomic():
+        stored = MailPayload.objects.bulk_create([
+            MailPayload(headline=headline, content=content, recipient_count=len(emails))
+            for emails, headline, content in payloads
+        ])
+        MailPayloadRecipient.objects.bulk_create(
+            (MailPayloadRecipient(payload=payload, email=email)
+             for payload, (emails, _, _) in zip(stored, payloads) for email in emails),
+            batch_size=INSERT_SIZE,
+        )
+    return stored
+
+
+def iter_payload_recipients(payload_id, fetch_size=FETCH_SIZE, start=0):
+    """
+    Yield the recipients of a payload in insertion order, one keyset page at
+    a time, skipping the first ``start``.
+    """
+    rows = MailPayloadRecipient.objects.filter(payload_id=payload_id).order_by('pk').values_list('pk', 'email')
+    page = list(rows[start:start + fetch_size])
+    while page:
+        for _, email in page:
+            yield email
+        page = list(rows.filter(pk__gt=page[-1][0])[:fetch_size])
+
+
+def resolve_payload(emails=None, headline=None, content=None, payload_id=None, start=0):
+    """
+    Return ``(emails, total, headline, content)`` for a notification task.
+
+    Tasks accept either a ``payload_id`` or, for messages enqueued and
+    schedules created before payloads were stored out of band, the inline
+    ``emails``, ``headline`` and ``content``. With a payload ``emails`` is a
+    lazy iterator over the stored recipients from the ``start``-th on.
+    """
+    if payload_id is None:
+        return emails, len(emails), headline, content
+    payload = MailPayload.objects.get(pk=payload_id)
+    return (iter_payload_recipients(payload_id, start=start), payload.recipient_count, payload.headline,
+            payload.content)
+
+
+def periodic_task_payload_ids():
+    """Ids of the payloads referenced by an enabled periodic task (its kwargs are a JSON string)."""
+    ids = set()
+    for kwargs in PeriodicTask.objects.filter(enabled=True, kwargs__contains='payload_id').values_list('kwargs', flat=True):
+        try:
+            ids.add(json.loads(kwargs)['payload_id'])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return ids
+
+
+def scheduled_payloads():
+    """
+    Filter for the payloads an enabled periodic task or a pending reminder
+    still refers to. Reminders may number in the hundreds of thousands, so
+    they are matched by a subquery in the database.
+    """
+    reminders = Reminder.objects.filter(status=Reminder.PENDING, kwargs__has_key='payload_id').annotate(
+        payload_ref=Cast(KeyTextTransform('payload_id', 'kwargs'), IntegerField())
+    ).filter(payload_ref=OuterRef('pk'))
+    return Q(pk__in=periodic_task_payload_ids()) | Q(Exists(reminders))
+
+
+def purge_payloads(retention_days=None):
+    """Delete payloads older than MAIL_PAYLOAD_RETENTION_DAYS that no schedule still needs."""
+    if retention_days is None:
+        retention_days = getattr(settings, 'MAIL_PAYLOAD_RETENTION_DAYS', 30)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    _, deleted = MailPayload.objects.filter(created__lt=cutoff).exclude(scheduled_payloads()).delete()
+    return deleted.get(MailPayload._meta.label, 0)
@@ -0,0 +1,143 @@
+"""
+Cached rendering of the email templates under ``templates/emails/``.
+
+Compiled templates are kept per worker process, including the fact that a
+template does not exist, so the optional ``.txt`` variant of an email costs
+one loader lookup per process rather than one failed lookup per recipient.
+With EMAIL_INLINE_CSS the HTML templates are the CSS-inlined versions
+prepared by ``inlining``.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.utils.autoreload import file_changed
+from django.utils.html import conditional_escape, strip_tags
+
+from .inlining import inlined_template
+from .metrics import RENDER_SECONDS
+
+# Recipient-dependent context variables understood by PersonalisedEmail
+RECIPIENT_FIELDS = ('user_email',)
+
+
+@lru_cache(maxsize=None)
+def get_email_template(name):
+    """Return the compiled template ``name``, or None if it does not exist."""
+    try:
+        template = get_template(name)
+    except TemplateDoesNotExist:
+        return None
+    if settings.EMAIL_INLINE_CSS and name.endswith('.html'):
+        try:
+            return inlined_template(name)
+        except (ValueError, TemplateSyntaxError) as e:
+            print(f"Sending {name} without inlined CSS: {e}")
+    return template
+
+
+def clear_template_cache(**kwargs):
+    get_email_template.cache_clear()
+
+
+# Template edits are picked up by the dev server without a restart
+file_changed.connect(clear_template_cache, dispatch_uid='send_email_app.clear_template_cache')
+
+
+def base_context(context=None):
+    context = dict(context or {})
+    context.setdefault('current_year', datetime.now().year)
+    return context
+
+
+def render_email(template_name, context=None):
+    """
+    Render ``emails/<template_name>.html`` and its plain text counterpart.
+
+    When ``emails/<template_name>.txt`` does not exist the text part is the
+    HTML with its tags stripped.
+    """
+    context = base_context(context)
+    with RENDER_SECONDS.labels(template_name).time():
+        html_content = get_email_template(f'emails/{template_name}.html').render(context)
+        text_template = get_email_template(f'emails/{template_name}.txt')
+        if text_template is None:
+            text_content = strip_tags(html_content)
+        else:
+            text_content = text_template.render(context)
+    return html_content, text_content
+
+
+def placeholder(field):
+    # Only word characters, so HTML escaping leaves it untouched
+    return f'__clock_work_{field}__'
+
+
+class SlotTemplate:
+    """
+    Rendered output split once into static segments and recipient-field
+    slots: ``segments[i]`` is followed by the value of ``slots[i]``, and the
+    last segment ends the output. ``fill`` is a single join.
+    """
+
+    def __init__(self, content, fields):
+        pattern = re.compile('|'.join(re.escape(placeholder(field)) for field in fields)) if fields else None
+        placeholders = {placeholder(field): field for field in fields}
+        self.segments, self.slots = [], []
+        position = 0
+        for match in (pattern.finditer(content) if pattern else ()):
+            self.segments.append(content[position:match.start()])
+            self.slots.append(placeholders[match.group()])
+            position = match.end()
+        self.segments.append(content[position:])
+
+    def fill(self, values):
+        """Assemble the output with the already escaped ``values`` by field."""
+        parts = [None] * (2 * len(self.slots) + 1)
+        parts[::2] = self.segments
+        parts[1::2] = [values[field] for field in self.slots]
+        return ''.join(parts)
+
+
+class PersonalisedEmail:
+    """
+    Render an email once and fill in the recipient fields per recipient.
+
+    The template is rendered a single time with a placeholder for each of
+    ``fields`` and the output split into static segments and field slots;
+    ``render`` then joins the segments with the escaped per-recipient
+    values. Recipient fields must be output as-is by the template (filters
+    such as ``default`` are fine, ``upper`` or ``title`` are not), which
+    holds for every template under ``templates/emails/``.
+    """
+
+    def __init__(self, template_name, context=None, fields=RECIPIENT_FIELDS):
+        self.fields = tuple(fields)
+        context = base_context(context)
+        context.update({field: placeholder(field) for field in self.fields})
+        self.html_content, self.text_content = render_email(template_name, context)
+        self.html_slots = SlotTemplate(self.html_content, self.fields)
+        self.text_slots = SlotTemplate(self.text_content, self.fields)
+
+    def render(self, **values):
+        """Return the (html, text) pair for one recipient."""
+        values = {field: conditional_escape(values.get(field, '')) for field in self.fields}
+        return self.html_slots.fill(values), self.text_slots.fill(values)
+
+    def render_batch(self, recipients):
+        """Return the (html, text) pairs for a list of per-recipient value dicts."""
+        return [self.render(**values) for values in recipients]
+
+
+def render_email_batch(template_name, recipients, context=None):
+    """
+    Render ``template_name`` for every per-recipient value dict in
+    ``recipients``, running the template engine once for the whole batch.
+    The fields are the keys found in ``recipients``; ``context`` holds the
+    values shared by everyone.
+    """
+    fields = sorted({field for values in recipients for field in values})
+    return PersonalisedEmail(template_name, context, fields).render_batch(recipients)
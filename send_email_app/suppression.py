@@ -0,0 +1,74 @@
+"""
+Suppression list of addresses that must not be mailed, kept as a Redis set.
+
+Membership of a whole recipient list is checked with SMISMEMBER, one round
+trip per LOOKUP_SIZE addresses. Addresses are stored case-folded. The set is
+an index over the SuppressedRecipient table, which Mailjet bounce and
+complaint events feed (see ``events``), and can be rebuilt from it with
+``manage.py rebuild_suppression_index``.
+"""
+import redis
+from django.conf import settings
+
+from .delivery import chunked
+
+LOOKUP_SIZE = 1000
+
+_redis = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_CLOUD_URL)
+    return _redis
+
+
+def suppression_key():
+    return getattr(settings, 'EMAIL_SUPPRESSION_KEY', f'{settings.PROJECT_NAME}:suppressed')
+
+
+def normalise(email):
+    # Same as recipients.normalise_email, which imports this module
+    return email.strip().casefold()
+
+
+def suppressed_recipients(emails):
+    """The subset of ``emails`` on the suppression list."""
+    suppressed = set()
+    for chunk in chunked(emails, LOOKUP_SIZE):
+        flags = get_redis().smismember(suppression_key(), [normalise(email) for email in chunk])
+        suppressed.update(email for email, flag in zip(chunk, flags) if flag)
+    return suppressed
+
+
+def suppress(*emails):
+    """Add ``emails`` to the suppression list."""
+    if emails:
+        get_redis().sadd(suppression_key(), *(normalise(email) for email in emails))
+
+
+def unsuppress(*emails):
+    """Remove ``emails`` from the suppression list."""
+    if emails:
+        get_redis().srem(suppression_key(), *(normalise(email) for email in emails))
+
+
+def replace_suppressions(emails):
+    """
+    Replace the whole suppression list with ``emails``. The new set is built
+    under a temporary key and renamed over the old one, so senders never see
+    it half-filled. Returns the number of addresses loaded.
+    """
+    key = suppression_key()
+    building = f'{key}:building'
+    redis_client = get_redis()
+    redis_client.delete(building)
+    count = 0
+    for chunk in chunked(emails, LOOKUP_SIZE):
+        count += redis_client.sadd(building, *(normalise(email) for email in chunk))
+    if count:
+        redis_client.rename(building, key)
+    else:
+        redis_client.delete(key)
+    return count
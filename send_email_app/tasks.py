@@ -1,146 +1,365 @@
+import asyncio
 import json
 import time
+import uuid
 from random import random
-from datetime import datetime
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.contrib.auth import get_user_model
 from celery_progress.backend import ProgressRecorder
 from celery_progress.websockets.backend import WebSocketProgressRecorder
-from celery import shared_task
+from celery import chord, current_app, shared_task, states
+from celery.result import AsyncResult
 from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from mailjet_rest import Client
 
-mailjet = Client(auth=(settings.MAIL_JET_API_KEY, settings.MAIL_JET_API_SECRET), version='v3.1')
+from clock_work.progress import ThrottledProgressRecorder
+from .async_delivery import send_in_batches_async
+from .delivery import chunked, send_batch, send_in_batches
+from .ledger import (LOOKUP_SIZE, RetryableDeliveryError, custom_id, delivered_recipients, is_retryable,
+                     purge_deliveries, record_results)
+from .metrics import count_results, observe_task_recipients
+from .models import CheckpointBusy, MailCheckpoint
+from .payloads import purge_payloads, resolve_payload
+from .recipients import active_accounts, iter_recipients, pk_ranges
+from .rendering import PersonalisedEmail, render_email
+from .suppression import suppressed_recipients
+
+
+def mailjet_message(to_email, subject, html_content, text_content, from_name="Clock Work", custom_id=None):
+    """Mailjet v3.1 message with improved headers for deliverability"""
+    return {
+        "From": {
+            "Email": settings.MAIL_JET_EMAIL_ADDRESS,
+            "Name": from_name
+        },
+        "To": [
+            {
+                "Email": to_email,
+                "Name": to_email.split('@')[0].title()
+            }
+        ],
+        "Subject": subject,
+        "TextPart": text_content,
+        "HTMLPart": html_content,
+        "CustomID": custom_id or f"{to_email}_{int(time.time())}",
+        "Headers": {
+            "Reply-To": settings.MY_EMAIL_ADDRESS,
+        },
+        # Add list unsubscribe header for better deliverability
+        "CustomCampaign": "clock_work_notifications"
+    }
+
+
+def build_email_message(to_email, subject, template_name, context=None, from_name="Clock Work"):
+    """
+    Render a template into a single Mailjet message with both HTML and plain
+    text versions. This improves deliverability and reduces spam score.
+    """
+    context = dict(context or {}, user_email=to_email)
+    html_content, text_content = render_email(template_name, context)
+    return mailjet_message(to_email, subject, html_content, text_content, from_name)
+
+
+def build_personalised_messages(emails, subject, template_name, context=None, from_name="Clock Work", campaign=None):
+    """
+    Lazily build one message per recipient, rendering the template only once
+    and filling in the recipient-specific fields for each address. Messages
+    of a campaign get a CustomID that is stable across retries.
+    """
+    email = PersonalisedEmail(template_name, context)
+    for to_email in emails:
+        html_content, text_content = email.render(user_email=to_email)
+        yield mailjet_message(to_email, subject, html_content, text_content, from_name,
+                              custom_id=custom_id(campaign, to_email) if campaign else None)
 
 
 def send_email_with_template(to_email, subject, template_name, context=None, from_name="Clock Work"):
     """
     Send email using Django templates with both HTML and plain text versions.
-    This improves deliverability and reduces spam score.
-    """
-    if context is None:
-        context = {}
-    
-    # Add common context variables
-    context.update({
-        'current_year': datetime.now().year,
-        'user_email': to_email,
-    })
-    
-    # Render HTML email from template
-    html_content = render_to_string(f'emails/{template_name}.html', context)
-    
-    # Try to render plain text version, fallback to stripped HTML
-    try:
-        text_content = render_to_string(f'emails/{template_name}.txt', context)
-    except:
-        text_content = strip_tags(html_content)
-    
-    # Prepare Mailjet data with improved headers for deliverability
-    data = {
-        'Messages': [
-            {
-                "From": {
-                    "Email": settings.MAIL_JET_EMAIL_ADDRESS,
-                    "Name": from_name
-                },
-                "To": [
-                    {
-                        "Email": to_email,
-                        "Name": to_email.split('@')[0].title()
-                    }
-                ],
-                "Subject": subject,
-                "TextPart": text_content,
-                "HTMLPart": html_content,
-                "CustomID": f"{to_email}_{int(time.time())}",
-                "Headers": {
-                    "Reply-To": settings.MY_EMAIL_ADDRESS,
-                },
-                # Add list unsubscribe header for better deliverability
-                "CustomCampaign": "clock_work_notifications"
-            }
-        ]
+    """
+    message = build_email_message(to_email, subject, template_name, context, from_name)
+    result = send_batch([message])[0]
+    count_results([result], template_name)
+    if not result.success:
+        print(f"Error sending email to {to_email}: {result.error}")
+    return result.success
+
+
+def notification_messages(emails, headline, content, campaign=None):
+    """Lazily build one notification message per recipient."""
+    context = {
+        'headline': headline,
+        'content': content,
+        'subject': headline,
     }
-    
-    try:
-        result = mailjet.send.create(data=data)
-        return result.status_code == 200
-    except Exception as e:
-        print(f"Error sending email to {to_email}: {str(e)}")
-        return False
+    return build_personalised_messages(emails, headline, 'notification_email', context, campaign=campaign)
+
+
+class DeliveryReport:
+    """
+    Running totals of one bulk send of ``total`` recipients, fed one batch
+    of results at a time.
+
+    With a ``campaign`` the recipients already marked sent in the delivery
+    ledger are filtered out by ``pending`` and counted as skipped, as are
+    suppressed recipients, and every batch's results are recorded in the
+    ledger as soon as they arrive.
+    Results are counted in the delivery metrics under ``template``.
+
+    With a ``checkpoint`` the report starts from its counts and saves them
+    back every MAIL_CHECKPOINT_INTERVAL recipients. Recipients are handled
+    in order, so ``done`` is the number of recipients to skip on resuming;
+    once a message fails with a transient error the checkpoint stops
+    advancing, so that a retry of the task sends it again, but its heartbeat
+    is still refreshed at that interval.
+    """
+
+    def __init__(self, total, campaign=None, progress_recorder=None, template='notification_email',
+                 checkpoint=None):
+        self.total = total
+        self.campaign = campaign
+        self.progress_recorder = progress_recorder
+        self.template = template
+        self.checkpoint = checkpoint
+        self.skipped = self.sent = self.failed = self.retryable = 0
+        self.reported = None
+        if checkpoint is not None:
+            self.skipped, self.sent, self.failed = checkpoint.skipped, checkpoint.sent, checkpoint.failed
+        self.checkpoint_interval = getattr(settings, 'MAIL_CHECKPOINT_INTERVAL', 500)
+        self.last_beat = self.done
+        observe_task_recipients(total)
+
+    def pending(self, emails):
+        """
+        Lazily yield the addresses of ``emails`` still to be sent, leaving
+        out those on the suppression list when EMAIL_SUPPRESSION_LIST is on.
+        """
+        check_suppressed = getattr(settings, 'EMAIL_SUPPRESSION_LIST', False)
+        if not self.campaign and not check_suppressed:
+            yield from emails
+            return
+        for chunk in chunked(emails, LOOKUP_SIZE):
+            excluded = delivered_recipients(self.campaign, chunk) if self.campaign else set()
+            if check_suppressed:
+                excluded |= suppressed_recipients(chunk)
+            for email in chunk:
+                if email in excluded:
+                    self.skipped += 1
+                else:
+                    yield email
+
+    @property
+    def done(self):
+        return self.skipped + self.sent + self.failed
+
+    def add(self, results):
+        if self.campaign:
+            record_results(self.campaign, results)
+        count_results(results, self.template)
+        for result in results:
+            if result.success:
+                self.sent += 1
+            else:
+                self.failed += 1
+                self.retryable += is_retryable(result)
+                print(f"Error sending email to {result.email}: {result.error}")
+        if self.checkpoint is not None and self.done - self.last_beat >= self.checkpoint_interval:
+            self.last_beat = self.done
+            if self.retryable:
+                self.checkpoint.touch()
+            else:
+                self.checkpoint.save_progress(self)
+        self.report_progress()
+
+    def report_progress(self):
+        if self.progress_recorder is not None:
+            self.reported = self.done
+            self.progress_recorder.set_progress(self.done, self.total, f'Sent notification to {self.done} of {self.total} recipients')
+
+    def finish(self):
+        """
+        Report the final progress once every recipient is handled, counting
+        those skipped after the last batch, and forward any update the
+        recorder is still holding back.
+        """
+        if self.progress_recorder is None:
+            return
+        if self.reported != self.done:
+            self.report_progress()
+        if hasattr(self.progress_recorder, 'flush'):
+            self.progress_recorder.flush()
+
+    def raise_for_retryable(self):
+        """Raise RetryableDeliveryError if any message hit a transient error."""
+        if self.retryable:
+            raise RetryableDeliveryError(f"{self.retryable} of {self.total} messages failed with transient errors")
+
+    def as_dict(self):
+        return {'sent': self.sent, 'failed': self.failed, 'skipped': self.skipped}
+
+
+def deliver_notifications(emails, headline, content, progress_recorder=None, campaign=None, total=None,
+                          checkpoint=None):
+    """
+    Send a notification to every address in ``emails`` using batched Mailjet
+    requests, reporting progress once per batch. ``emails`` may be a lazy
+    iterable when its ``total`` is given. With a ``checkpoint``, ``emails``
+    are the recipients after its position. Returns a DeliveryReport.
+    """
+    report = DeliveryReport(len(emails) if total is None else total, campaign, progress_recorder,
+                            checkpoint=checkpoint)
+    for results in send_in_batches(notification_messages(report.pending(emails), headline, content, campaign)):
+        report.add(results)
+    report.finish()
+    if checkpoint is not None and not report.retryable:
+        checkpoint.save_progress(report, MailCheckpoint.COMPLETED)
+    return report
+
+
+def deliver_checkpointed_notifications(task, emails=None, headline=None, content=None, payload_id=None,
+                                       progress_recorder=None):
+    """
+    Run ``deliver_notifications`` for a notification ``task``. Sends of a
+    stored payload are checkpointed under the task id, so a redelivered or
+    resumed run continues from the last checkpoint and a run of a completed
+    send does nothing. A run finding another one still alive retries later.
+    """
+    checkpoint = None
+    if payload_id is not None:
+        try:
+            checkpoint = MailCheckpoint.claim(task.request.id, task.name, payload_id,
+                                              owner=f"{task.request.hostname}:{uuid.uuid4().hex}")
+        except CheckpointBusy as e:
+            # A live run (e.g. one a redelivery raced with) is sending; look again once it could be dead
+            raise task.retry(exc=e, countdown=settings.MAIL_CHECKPOINT_STALE_SECONDS)
+        if checkpoint.status == MailCheckpoint.COMPLETED:
+            return
+    emails, total, headline, content = resolve_payload(emails, headline, content, payload_id,
+                                                       start=checkpoint.position if checkpoint else 0)
+    deliver_notifications(emails, headline, content, progress_recorder, campaign=task.request.id, total=total,
+                          checkpoint=checkpoint).raise_for_retryable()
+
+
+def with_task_request(task, func):
+    """
+    Wrap ``func`` so that it runs with ``task``'s request as the current one.
+    Celery keeps the request per thread, so progress recorders called from a
+    worker thread would otherwise not know the task id.
+    """
+    request = task.request
+
+    def wrapper(*args, **kwargs):
+        task.request_stack.push(request)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            task.request_stack.pop()
+    return wrapper
+
+
+def deliver_notifications_async(emails, headline, content, progress_recorder=None, concurrency=None, rate_limit=None,
+                                campaign=None, task=None, total=None):
+    """
+    Same as ``deliver_notifications`` but with several batches in flight at
+    once over an asyncio HTTP client. Returns a DeliveryReport. Results are
+    handled in a worker thread, where ``task``'s request is made current.
+    """
+    report = DeliveryReport(len(emails) if total is None else total, campaign, progress_recorder)
+    # The event loop may not touch the database, so resolve the recipients first
+    pending = list(report.pending(emails))
+    asyncio.run(send_in_batches_async(
+        notification_messages(pending, headline, content, campaign),
+        on_results=with_task_request(task, report.add) if task is not None else report.add,
+        concurrency=concurrency,
+        rate_limit=rate_limit,
+    ))
+    report.finish()
+    return report
+
+
+# Bulk sends consult the delivery ledger, so they can be acknowledged late and
+# retried on transient provider errors without mailing anyone twice.
+BULK_SEND_TASK_OPTIONS = {
+    'acks_late': True,
+    'reject_on_worker_lost': True,
+    'autoretry_for': (RetryableDeliveryError,),
+    'retry_backoff': True,
+    'max_retries': 5,
+}
+
+WELCOME_EMAIL_SUBJECT = "Welcome to Clock Work - Your Reminder & Notes Manager"
 
 
 @shared_task(bind=True, name='clock_work.send_email_app.send_mail_func')
-def send_mail_func(self):
-    """Send welcome email to all users using professional template"""
-    users = get_user_model().objects.all()
-    for user in users:
-        context = {
-            'user_email': user.email,
-        }
-        send_email_with_template(
-            to_email=user.email,
-            subject="Welcome to Clock Work - Your Reminder & Notes Manager",
-            template_name='welcome_email',
-            context=context
-        )
-    return "Done"
+def send_mail_func(self, chunk_size=None):
+    """
+    Send welcome email to all active users using professional template.
 
+    Users are split into primary-key ranges and each range is mailed by its
+    own send_welcome_mail_chunk subtask, so the work spreads across workers
+    and a failure only affects one chunk. aggregate_send_results reports the
+    totals once every chunk has finished.
+    """
+    chunk_size = chunk_size or settings.BULK_MAIL_CHUNK_SIZE
+    ranges = pk_ranges(active_accounts(), chunk_size)
+    if not ranges:
+        return {'chunks': 0, 'sent': 0, 'failed': 0, 'skipped': 0}
+    chord(send_welcome_mail_chunk.s(after_pk, last_pk) for after_pk, last_pk in ranges)(aggregate_send_results.s())
+    return f"Dispatched {len(ranges)} chunks"
 
-@shared_task(bind=True, name='clock_work.send_email_app.send_mail_task')
-def send_mail_task(self, emails, headline, content):
-    """Send notification email to multiple recipients with progress tracking"""
-    progress_recorder = ProgressRecorder(self)
-    for email_no in range(len(emails)):
-        context = {
-            'headline': headline,
-            'content': content,
-            'subject': headline,
-            'user_email': emails[email_no],
-        }
-        
-        send_email_with_template(
-            to_email=emails[email_no],
-            subject=headline,
-            template_name='notification_email',
-            context=context
-        )
-        
-        progress_recorder.set_progress(email_no + 1, len(emails), f'Sending notification to {emails[email_no]}')
 
+@shared_task(bind=True, name='clock_work.send_email_app.send_welcome_mail_chunk', **BULK_SEND_TASK_OPTIONS)
+def send_welcome_mail_chunk(self, after_pk, last_pk):
+    """Send the welcome email to the active users with after_pk < pk <= last_pk"""
+    emails = [recipient['email'] for recipient in iter_recipients(after_pk=after_pk, last_pk=last_pk)]
+    progress_recorder = ThrottledProgressRecorder(ProgressRecorder(self))
+    report = DeliveryReport(len(emails), campaign=self.request.id, progress_recorder=progress_recorder,
+                            template='welcome_email')
+    messages = build_personalised_messages(
+        report.pending(emails),
+        subject=WELCOME_EMAIL_SUBJECT,
+        template_name='welcome_email',
+        campaign=self.request.id
+    )
+    for results in send_in_batches(messages):
+        report.add(results)
+    report.finish()
+    report.raise_for_retryable()
+    return report.as_dict()
+
+
+@shared_task(bind=True, name='clock_work.send_email_app.aggregate_send_results')
+def aggregate_send_results(self, results):
+    """Chord callback: total up the per-chunk counts"""
+    return {
+        'chunks': len(results),
+        'sent': sum(result['sent'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+        'skipped': sum(result.get('skipped', 0) for result in results),
+    }
+
+
+@shared_task(bind=True, name='clock_work.send_email_app.send_mail_task', **BULK_SEND_TASK_OPTIONS)
+def send_mail_task(self, emails=None, headline=None, content=None, payload_id=None):
+    """Send notification email to multiple recipients with progress tracking"""
+    progress_recorder = ThrottledProgressRecorder(ProgressRecorder(self))
+    deliver_checkpointed_notifications(self, emails, headline, content, payload_id, progress_recorder)
     return "Done"
 
 
-@shared_task(bind=True, name='clock_work.send_email_app.send_mail_task_with_schedule')
-def send_mail_task_with_schedule(self, emails, headline, content):
+@shared_task(bind=True, name='clock_work.send_email_app.send_mail_task_with_schedule', **BULK_SEND_TASK_OPTIONS)
+def send_mail_task_with_schedule(self, emails=None, headline=None, content=None, payload_id=None):
     """Send scheduled notification email to multiple recipients"""
-    for email_no in range(len(emails)):
-        context = {
-            'headline': headline,
-            'content': content,
-            'subject': headline,
-            'user_email': emails[email_no],
-        }
-        
-        send_email_with_template(
-            to_email=emails[email_no],
-            subject=headline,
-            template_name='notification_email',
-            context=context
-        )
+    emails, total, headline, content = resolve_payload(emails, headline, content, payload_id)
+    deliver_notifications(emails, headline, content, campaign=self.request.id, total=total).raise_for_retryable()
 
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         "notification_broadcast",
         {
             'type': 'send_notification',
-            'message': json.dumps(f"Mail sent to {emails} with headline {headline}")
+            'message': json.dumps(f"Mail sent to {total} recipients with headline {headline}")
         }
     )
     return "Done"
@@ -148,32 +367,64 @@ def send_mail_task_with_schedule(self, emails, headline, content):
 
 @shared_task(bind=True, name='clock_work.send_email_app.ws_task')
 def ws_task(self, number):
-    progress_recorder = WebSocketProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(WebSocketProgressRecorder(self))
     for i in range(number):
         time.sleep(.1)
         progress_recorder.set_progress(i + 1, number)
     return int(random() * 1000)
 
 
-@shared_task(bind=True, name='clock_work.send_email_app.web_socket_send_mail_task')
-def web_socket_send_mail_task(self, emails, headline, content):
+@shared_task(bind=True, name='clock_work.send_email_app.web_socket_send_mail_task', **BULK_SEND_TASK_OPTIONS)
+def web_socket_send_mail_task(self, emails=None, headline=None, content=None, payload_id=None):
     """Send notification email via WebSocket with progress tracking"""
-    progress_recorder = WebSocketProgressRecorder(self)
-    for email_no in range(len(emails)):
-        context = {
-            'headline': headline,
-            'content': content,
-            'subject': headline,
-            'user_email': emails[email_no],
-        }
-        
-        send_email_with_template(
-            to_email=emails[email_no],
-            subject=headline,
-            template_name='notification_email',
-            context=context
-        )
-        
-        progress_recorder.set_progress(email_no + 1, len(emails), f'Sending notification to {emails[email_no]}')
+    progress_recorder = ThrottledProgressRecorder(WebSocketProgressRecorder(self))
+    deliver_checkpointed_notifications(self, emails, headline, content, payload_id, progress_recorder)
+    return "Done"
+
 
+@shared_task(bind=True, name='clock_work.send_email_app.async_send_mail_task', **BULK_SEND_TASK_OPTIONS)
+def async_send_mail_task(self, emails=None, headline=None, content=None, websocket=False, concurrency=None,
+                         rate_limit=None, payload_id=None):
+    """Send notification email with concurrent Mailjet requests and progress tracking"""
+    emails, total, headline, content = resolve_payload(emails, headline, content, payload_id)
+    recorder = WebSocketProgressRecorder(self) if websocket else ProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(recorder)
+    report = deliver_notifications_async(emails, headline, content, progress_recorder, concurrency, rate_limit,
+                                         campaign=self.request.id, task=self, total=total)
+    report.raise_for_retryable()
     return "Done"
+
+
+@shared_task(bind=True, name='clock_work.send_email_app.purge_mail_payloads')
+def purge_mail_payloads(self):
+    """Delete stored mail payloads and delivery ledger rows that are past their retention period"""
+    return f"Deleted {purge_payloads()} payloads and {purge_deliveries()} deliveries"
+
+
+def resume_checkpoint(checkpoint):
+    """
+    Enqueue the task of an interrupted send again under its original id, so
+    it continues from ``checkpoint`` and its progress bar picks up again.
+
+    Only sends whose run is dead are resumed: still running, with a
+    heartbeat older than MAIL_CHECKPOINT_STALE_SECONDS and no retry pending.
+    Returns the AsyncResult, or None when the send was left alone.
+    """
+    checkpoint.refresh_from_db()
+    if checkpoint.status != MailCheckpoint.RUNNING or not checkpoint.is_stale():
+        return None
+    if AsyncResult(checkpoint.campaign).state in (states.STARTED, states.RETRY):
+        return None
+    task = current_app.tasks[checkpoint.task_name]
+    return task.apply_async(kwargs={'payload_id': checkpoint.payload_id}, task_id=checkpoint.campaign)
+
+
+@shared_task(bind=True, name='clock_work.send_email_app.resume_bulk_send')
+def resume_bulk_send(self, campaign):
+    """Resume the bulk send ``campaign`` from its last checkpoint"""
+    checkpoint = MailCheckpoint.objects.get(campaign=campaign)
+    if checkpoint.status == MailCheckpoint.COMPLETED:
+        return f"{campaign} already completed"
+    if resume_checkpoint(checkpoint) is None:
+        return f"{campaign} is still running"
+    return f"Resumed {campaign} at {checkpoint.position} of {checkpoint.payload.recipient_count}"
@@ -6,7 +6,9 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from send_email_app import views
 from unittest.mock import patch, MagicMock
+import datetime
 import json
+import os
 
 User = get_user_model()
 
@@ -86,3 +88,1223 @@ class SendEmailTasksTest(TestCase):
         from send_email_app.tasks import send_mail_func, send_mail_task
         self.assertTrue(hasattr(send_mail_func, 'delay'))
         self.assertTrue(hasattr(send_mail_task, 'delay'))
+
+
+class MailjetBatchDeliveryTest(TestCase):
+    """Test batched Mailjet delivery"""
+
+    def make_message(self, email):
+        return {'To': [{'Email': email, 'Name': email.split('@')[0]}], 'Subject': 'Hi'}
+
+    def mock_response(self, status_code, body):
+        response = MagicMock(status_code=status_code)
+        response.json.return_value = body
+        return response
+
+    def test_batch_size_is_clamped_to_mailjet_limit(self):
+        """Test batch size never exceeds the Send API limit"""
+        from send_email_app.delivery import get_batch_size
+        self.assertEqual(get_batch_size(500), 50)
+        self.assertEqual(get_batch_size(0), 1)
+        self.assertEqual(get_batch_size(10), 10)
+
+    def test_statuses_are_mapped_back_to_recipients(self):
+        """Test per-message statuses map to recipients in request order"""
+        from send_email_app.delivery import parse_send_response
+        messages = [self.make_message('a@example.com'), self.make_message('b@example.com')]
+        body = {'Messages': [
+            {'Status': 'success', 'To': [{'Email': 'a@example.com', 'MessageUUID': 'uuid-a'}]},
+            {'Status': 'error', 'Errors': [{'StatusCode': 400, 'ErrorMessage': 'Invalid email'}]},
+        ]}
+        results = parse_send_response(messages, 400, body)
+        self.assertEqual([r.email for r in results], ['a@example.com', 'b@example.com'])
+        self.assertTrue(results[0].success)
+        self.assertEqual(results[0].message_id, 'uuid-a')
+        self.assertFalse(results[1].success)
+        self.assertEqual(results[1].error, 'Invalid email')
+
+    def test_whole_batch_fails_without_message_statuses(self):
+        """Test a response without per-message data fails every message"""
+        from send_email_app.delivery import parse_send_response
+        messages = [self.make_message('a@example.com'), self.make_message('b@example.com')]
+        results = parse_send_response(messages, 401, {'ErrorMessage': 'Unauthorized'})
+        self.assertEqual([r.success for r in results], [False, False])
+        self.assertEqual(results[0].error, 'Unauthorized')
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_messages_are_grouped_into_batches(self, mock_get_client):
+        """Test 120 messages are sent in three requests"""
+        from send_email_app.delivery import send_in_batches
+
+        def create(data):
+            return self.mock_response(200, {'Messages': [
+                {'Status': 'success', 'To': [{'Email': m['To'][0]['Email'], 'MessageUUID': 'x'}]}
+                for m in data['Messages']
+            ]})
+
+        mock_get_client.return_value.send.side_effect = create
+        messages = (self.make_message(f'user{i}@example.com') for i in range(120))
+        batches = list(send_in_batches(messages, batch_size=50))
+        self.assertEqual([len(b) for b in batches], [50, 50, 20])
+        self.assertEqual(mock_get_client.return_value.send.call_count, 3)
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_send_mail_task_reports_progress_per_batch(self, mock_get_client):
+        """Test send_mail_task sends batched requests for all recipients"""
+        from send_email_app.tasks import deliver_notifications
+        mock_get_client.return_value.send.side_effect = lambda data: self.mock_response(200, {'Messages': [
+            {'Status': 'success', 'To': [{'Email': m['To'][0]['Email']}]} for m in data['Messages']
+        ]})
+        recorder = MagicMock()
+        emails = [f'user{i}@example.com' for i in range(60)]
+        report = deliver_notifications(emails, 'Headline', 'Content', recorder)
+        self.assertEqual((report.sent, report.failed), (60, 0))
+        self.assertEqual(mock_get_client.return_value.send.call_count, 2)
+        self.assertEqual(recorder.set_progress.call_count, 2)
+        recorder.set_progress.assert_called_with(60, 60, 'Sent notification to 60 of 60 recipients')
+
+
+class EmailRenderingTest(TestCase):
+    """Test cached email template rendering"""
+
+    def setUp(self):
+        from send_email_app.rendering import clear_template_cache
+        clear_template_cache()
+
+    def test_missing_text_template_is_cached(self):
+        """Test a missing .txt variant is looked up once and falls back to stripped HTML"""
+        from send_email_app import rendering
+        with patch('send_email_app.rendering.get_template', wraps=rendering.get_template) as mock_get:
+            for _ in range(3):
+                html, text = rendering.render_email('notification_email', {'content': 'Hello'})
+            self.assertEqual(mock_get.call_count, 2)
+        self.assertIn('Hello', text)
+        self.assertNotIn('<p>', text)
+
+    def test_text_template_is_used_when_present(self):
+        """Test the .txt variant is rendered when it exists"""
+        from send_email_app.rendering import render_email
+        html, text = render_email('welcome_email', {'user_email': 'a@example.com'})
+        self.assertTrue(text.startswith('Welcome to Clock Work!'))
+
+    def test_personalised_email_matches_full_render(self):
+        """Test render-once output equals a full per-recipient render"""
+        from send_email_app.rendering import PersonalisedEmail, render_email
+        context = {'headline': 'News', 'content': 'Body', 'subject': 'News'}
+        email = PersonalisedEmail('notification_email', context)
+        for address in ['a@example.com', "o'brien@example.com"]:
+            expected = render_email('notification_email', dict(context, user_email=address))
+            self.assertEqual(email.render(user_email=address), expected)
+
+    def test_batch_render_matches_full_render(self):
+        """Test render_email_batch renders once and matches per-recipient renders"""
+        from send_email_app import rendering
+        context = {'headline': 'News', 'content': 'Body', 'subject': 'News'}
+        recipients = [{'user_email': 'a@example.com'}, {'user_email': 'b&c@example.com'}]
+        expected = [rendering.render_email('notification_email', dict(context, **values)) for values in recipients]
+        with patch('send_email_app.rendering.render_email', wraps=rendering.render_email) as mock_render:
+            self.assertEqual(rendering.render_email_batch('notification_email', recipients, context), expected)
+        self.assertEqual(mock_render.call_count, 1)
+
+    def test_slot_template_joins_segments_and_values(self):
+        """Test rendered output is split into static segments and field slots"""
+        from send_email_app.rendering import SlotTemplate, placeholder
+        slots = SlotTemplate(f"Hi {placeholder('name')}, {placeholder('email')}!", ['name', 'email'])
+        self.assertEqual((slots.segments, slots.slots), (['Hi ', ', ', '!'], ['name', 'email']))
+        self.assertEqual(slots.fill({'name': 'Ann', 'email': 'a@b.c'}), 'Hi Ann, a@b.c!')
+
+
+class MailjetClientTest(TestCase):
+    """Test the shared pooled Mailjet client"""
+
+    def make_client(self):
+        from send_email_app.mailjet_client import MailjetClient
+        return MailjetClient('key', 'secret', pool_size=4, max_retries=2)
+
+    def test_session_is_reused_within_a_process(self):
+        """Test the same keep-alive session serves every call"""
+        client = self.make_client()
+        self.assertIs(client.session, client.session)
+
+    def test_session_is_rebuilt_after_fork(self):
+        """Test a forked worker does not share the parent's connections"""
+        client = self.make_client()
+        session = client.session
+        with patch('send_email_app.mailjet_client.os.getpid', return_value=-1):
+            self.assertIsNot(client.session, session)
+
+    def test_adapter_pool_and_retries(self):
+        """Test the adapter is bounded and only retries rejected requests"""
+        adapter = self.make_client().session.get_adapter('https://api.mailjet.com/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.read, 0)
+        self.assertEqual(tuple(adapter.max_retries.status_forcelist), (503,))
+
+    def test_send_posts_to_send_api(self):
+        """Test send posts the payload to the v3.1 Send endpoint with timeouts"""
+        client = self.make_client()
+        with patch.object(client.session, 'post') as mock_post:
+            client.send({'Messages': []})
+        mock_post.assert_called_once_with(
+            'https://api.mailjet.com/v3.1/send', json={'Messages': []}, timeout=client.timeout
+        )
+
+    def test_rate_limited_send_backs_off_throttle_and_retries(self):
+        """Test a 429 slows the shared throttle down before the request is retried"""
+        client = self.make_client()
+        throttle = MagicMock()
+        limited = MagicMock(status_code=429, headers={'Retry-After': '0'})
+        ok = MagicMock(status_code=200, headers={})
+        with patch('send_email_app.mailjet_client.get_mailjet_throttle', return_value=throttle), \
+                patch('send_email_app.mailjet_client.time.sleep'), \
+                patch.object(client.session, 'post', side_effect=[limited, ok]) as mock_post:
+            self.assertIs(client.send({'Messages': []}), ok)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(throttle.acquire.call_count, 2)
+        throttle.backoff.assert_called_once_with(0.0)
+
+    def test_rate_limited_send_gives_up_after_max_retries(self):
+        """Test the last 429 response is returned once retries are exhausted"""
+        client = self.make_client()
+        limited = MagicMock(status_code=429, headers={})
+        with patch('send_email_app.mailjet_client.time.sleep'), \
+                patch.object(client.session, 'post', return_value=limited) as mock_post:
+            self.assertIs(client.send({'Messages': []}), limited)
+        self.assertEqual(mock_post.call_count, 3)
+
+
+class TokenBucketTest(TestCase):
+    """Test the Redis token bucket shared by all Mailjet senders"""
+
+    def make_bucket(self, **kwargs):
+        import uuid
+        from django.conf import settings
+        from send_email_app.throttle import TokenBucket
+        bucket = TokenBucket(settings.REDIS_CLOUD_URL, f'test:{uuid.uuid4().hex}', **kwargs)
+        self.addCleanup(lambda: bucket.connect().delete(*bucket.keys))
+        return bucket
+
+    def test_burst_then_wait(self):
+        """Test the bucket hands out its capacity at once and then asks callers to wait"""
+        bucket = self.make_bucket(rate=10, capacity=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [0, 0, 0])
+        wait = bucket.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_backoff_cuts_rate_and_pauses(self):
+        """Test a 429 halves the refill rate and pauses senders for Retry-After"""
+        bucket = self.make_bucket(rate=10, capacity=1)
+        self.assertEqual(bucket.backoff(), 0.5)
+        self.assertEqual(bucket.backoff(), 0.25)
+        bucket.backoff(retry_after=5)
+        self.assertGreater(bucket.try_acquire(), 4)
+
+    def test_disabled_without_rate_limit(self):
+        """Test MAIL_JET_RATE_LIMIT=0 turns the throttle off"""
+        from send_email_app import throttle
+        with patch.object(throttle, '_throttle', None):
+            self.assertIsInstance(throttle.get_mailjet_throttle(), throttle.NoThrottle)
+
+
+class AsyncDeliveryTest(TestCase):
+    """Test concurrent asyncio delivery"""
+
+    def test_rate_limiter_spaces_requests(self):
+        """Test the rate limiter allows at most `rate` acquisitions per second"""
+        import asyncio
+        import time
+        from send_email_app.async_delivery import RateLimiter
+
+        async def acquire_all():
+            limiter = RateLimiter(50)
+            for _ in range(6):
+                await limiter.wait()
+
+        start = time.monotonic()
+        asyncio.run(acquire_all())
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_batches_are_sent_concurrently_within_limit(self):
+        """Test batches overlap but never exceed the concurrency limit"""
+        import asyncio
+        import httpx
+        from send_email_app.async_delivery import send_in_batches_async
+        from send_email_app.transports import MailjetTransport
+
+        state = {'in_flight': 0, 'peak': 0}
+
+        async def handler(request):
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+            await asyncio.sleep(0.01)
+            state['in_flight'] -= 1
+            messages = json.loads(request.content)['Messages']
+            return httpx.Response(200, json={'Messages': [
+                {'Status': 'success', 'To': [{'Email': m['To'][0]['Email']}]} for m in messages
+            ]})
+
+        messages = ({'To': [{'Email': f'user{i}@example.com'}]} for i in range(100))
+        progress = []
+        results = asyncio.run(send_in_batches_async(
+            messages, on_results=lambda r: progress.append(len(r)), batch_size=10, concurrency=3,
+            rate_limit=0, transport=MailjetTransport(http_transport=httpx.MockTransport(handler))
+        ))
+        self.assertEqual(len(results), 100)
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(sum(progress), 100)
+        self.assertEqual(state['peak'], 3)
+
+    @patch('send_email_app.tasks.send_in_batches_async')
+    def test_async_send_mail_task_reports_progress(self, mock_send):
+        """Test the async task counts results and reports progress"""
+        from send_email_app.delivery import DeliveryResult
+        from send_email_app.tasks import deliver_notifications_async
+
+        async def fake_send(messages, on_results, **kwargs):
+            list(messages)
+            on_results([DeliveryResult('a@example.com', True, 200, None, None),
+                        DeliveryResult('b@example.com', False, 400, None, 'bad')])
+
+        mock_send.side_effect = fake_send
+        recorder = MagicMock()
+        report = deliver_notifications_async(['a@example.com', 'b@example.com'], 'H', 'C', recorder)
+        self.assertEqual((report.sent, report.failed), (1, 1))
+        recorder.set_progress.assert_called_once_with(2, 2, 'Sent notification to 2 of 2 recipients')
+
+
+class EmailTransportTest(TestCase):
+    """Test the pluggable email transports"""
+
+    def make_messages(self, count):
+        return [{
+            'From': {'Email': 'admin@example.com', 'Name': 'Clock Work'},
+            'To': [{'Email': f'user{i}@example.com', 'Name': f'user{i}'}],
+            'Subject': 'Hello', 'TextPart': 'Hi', 'HTMLPart': '<p>Hi</p>', 'CustomID': f'id-{i}',
+        } for i in range(count)]
+
+    def test_transport_selected_by_setting(self):
+        """Test EMAIL_TRANSPORT picks the transport used by send_batch"""
+        from send_email_app import delivery
+        from send_email_app.transports import FakeTransport
+        with self.settings(EMAIL_TRANSPORT='send_email_app.transports.FakeTransport'), \
+                patch.object(delivery, '_transport', None):
+            self.assertIsInstance(delivery.get_transport(), FakeTransport)
+
+    def test_django_transport_uses_email_backend(self):
+        """Test the Django transport sends one multipart email per message"""
+        from django.core import mail
+        from send_email_app.delivery import send_batch
+        from send_email_app.transports import DjangoEmailTransport
+
+        results = send_batch(self.make_messages(3), transport=DjangoEmailTransport())
+        self.assertTrue(all(r.success for r in results))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['user0 <user0@example.com>'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(mail.outbox[0].extra_headers['X-MJ-CustomID'], 'id-0')
+
+    def test_fake_transport_simulates_errors_and_rate_limits(self):
+        """Test the fake transport fails messages and whole batches at the configured rates"""
+        from send_email_app.transports import FakeTransport
+
+        failing = FakeTransport(latency=0, error_rate=1.0, seed=1).send_batch(self.make_messages(2))
+        self.assertEqual([(r.success, r.status_code) for r in failing], [(False, 400), (False, 400)])
+        limited = FakeTransport(latency=0, rate_limited_rate=1.0, seed=1).send_batch(self.make_messages(2))
+        self.assertEqual({r.status_code for r in limited}, {429})
+        ok = FakeTransport(latency=0, seed=1).send_batch(self.make_messages(2))
+        self.assertTrue(all(r.success and r.message_id for r in ok))
+
+    def test_fake_transport_never_touches_the_mailjet_throttle(self):
+        """Test simulated 429s back off the fake transport's own bucket, not the production one"""
+        from send_email_app import throttle
+        from send_email_app.transports import FakeTransport
+
+        own = MagicMock()
+        with patch('send_email_app.throttle.get_mailjet_throttle') as mock_mailjet:
+            FakeTransport(latency=0, rate_limited_rate=1.0, seed=1, throttle=own).send_batch(self.make_messages(2))
+        own.backoff.assert_called_once_with(1)
+        mock_mailjet.assert_not_called()
+
+        with self.settings(MAIL_JET_RATE_LIMIT=10), patch.object(throttle, '_fake_throttle', None), \
+                patch.object(throttle, '_throttle', None):
+            self.assertTrue(throttle.get_fake_throttle().key.endswith(':mailjet:fake'))
+            self.assertTrue(throttle.get_mailjet_throttle().key.endswith(':mailjet'))
+
+    def test_fake_transport_async(self):
+        """Test the async path overlaps fake requests instead of using threads"""
+        import asyncio
+        import time
+        from send_email_app.async_delivery import send_in_batches_async
+        from send_email_app.transports import FakeTransport
+
+        start = time.monotonic()
+        results = asyncio.run(send_in_batches_async(
+            self.make_messages(100), batch_size=10, concurrency=10, rate_limit=0,
+            transport=FakeTransport(latency=0.05, jitter=0),
+        ))
+        self.assertEqual(len(results), 100)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+
+class ChunkedWelcomeMailTest(TestCase):
+    """Test chunked fan-out of the welcome email"""
+
+    def setUp(self):
+        for i in range(5):
+            User.objects.create_user(email=f'user{i}@example.com', username=f'user{i}', password='testpass123')
+        User.objects.create_user(email='inactive@example.com', username='inactive', password='testpass123')
+        User.objects.update(is_active=True)
+        User.objects.filter(username='inactive').update(is_active=False)
+
+    def test_iter_recipients_streams_active_accounts(self):
+        """Test recipients are paged by primary key, active only, with the mail fields"""
+        from send_email_app.recipients import iter_recipients
+        with self.assertNumQueries(4):
+            recipients = list(iter_recipients(fetch_size=2))
+        self.assertEqual([r['email'] for r in recipients], [f'user{i}@example.com' for i in range(5)])
+        self.assertEqual(set(recipients[0]), {'pk', 'email', 'username'})
+
+    def test_iter_recipients_includes_name_when_model_has_it(self):
+        """Test the Account model's name column is streamed too"""
+        from account.models import Account
+        from send_email_app.recipients import iter_recipients
+        account = Account.objects.create_user(email='acc@example.com', username='acc', password='testpass123')
+        Account.objects.filter(pk=account.pk).update(is_active=True, name='Acc')
+        recipients = list(iter_recipients(Account.objects.all()))
+        self.assertEqual(recipients, [{'pk': account.pk, 'email': 'acc@example.com', 'username': 'acc', 'name': 'Acc'}])
+
+    def test_iter_recipients_respects_pk_bounds(self):
+        """Test a chunk only streams its own primary-key range"""
+        from send_email_app.recipients import iter_recipients
+        pks = list(User.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+        recipients = list(iter_recipients(after_pk=pks[0], last_pk=pks[2], fetch_size=1))
+        self.assertEqual([r['pk'] for r in recipients], pks[1:3])
+
+    def test_pk_ranges_cover_every_row_once(self):
+        """Test primary-key ranges partition the table into fixed-size chunks"""
+        from send_email_app.recipients import pk_ranges
+        ranges = pk_ranges(User.objects.filter(is_active=True), 2)
+        self.assertEqual(len(ranges), 3)
+        self.assertIsNone(ranges[0][0])
+        covered = []
+        for after_pk, last_pk in ranges:
+            users = User.objects.filter(pk__lte=last_pk)
+            if after_pk is not None:
+                users = users.filter(pk__gt=after_pk)
+            covered.extend(users.values_list('pk', flat=True))
+        self.assertEqual(sorted(covered), sorted(User.objects.filter(is_active=True).values_list('pk', flat=True)))
+
+    def test_pk_ranges_empty_table(self):
+        """Test an empty queryset yields no chunks"""
+        from send_email_app.recipients import pk_ranges
+        self.assertEqual(pk_ranges(User.objects.none(), 2), [])
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_send_mail_func_fans_out_chunks(self, mock_get_client):
+        """Test every active user is mailed through one subtask per chunk"""
+        from send_email_app.tasks import send_mail_func
+        mock_get_client.return_value.send.side_effect = lambda data: MagicMock(
+            status_code=200,
+            json=MagicMock(return_value={'Messages': [
+                {'Status': 'success', 'To': [{'Email': m['To'][0]['Email']}]} for m in data['Messages']
+            ]})
+        )
+        result = send_mail_func.apply(kwargs={'chunk_size': 2}).get()
+        self.assertEqual(result, 'Dispatched 3 chunks')
+        self.assertEqual(mock_get_client.return_value.send.call_count, 3)
+        recipients = [m['To'][0]['Email']
+                      for call in mock_get_client.return_value.send.call_args_list
+                      for m in call.args[0]['Messages']]
+        self.assertEqual(sorted(recipients), [f'user{i}@example.com' for i in range(5)])
+
+    def test_aggregate_send_results(self):
+        """Test the chord callback totals chunk counts"""
+        from send_email_app.tasks import aggregate_send_results
+        totals = aggregate_send_results.apply(args=[[{'sent': 2, 'failed': 0}, {'sent': 1, 'failed': 1}]]).get()
+        self.assertEqual(totals, {'chunks': 2, 'sent': 3, 'failed': 1, 'skipped': 0})
+
+
+class DeliveryLedgerTest(TestCase):
+    """Test the idempotent delivery ledger"""
+
+    def respond(self, statuses):
+        """Mailjet stub answering each message with the status mapped to its recipient"""
+        def send(data):
+            entries = []
+            for message in data['Messages']:
+                email = message['To'][0]['Email']
+                if statuses.get(email, 200) == 200:
+                    entries.append({'Status': 'success', 'To': [{'Email': email, 'MessageUUID': f'uuid-{email}'}]})
+                else:
+                    entries.append({'Status': 'error', 'Errors': [{'StatusCode': statuses[email], 'ErrorMessage': 'nope'}]})
+            return MagicMock(status_code=200, json=MagicMock(return_value={'Messages': entries}))
+        return send
+
+    def test_custom_id_is_stable(self):
+        """Test the CustomID only depends on campaign and recipient"""
+        from send_email_app.ledger import custom_id
+        self.assertEqual(custom_id('task-1', 'a@example.com'), custom_id('task-1', 'a@example.com'))
+        self.assertNotEqual(custom_id('task-1', 'a@example.com'), custom_id('task-2', 'a@example.com'))
+
+    def test_record_results_upserts(self):
+        """Test recording the same recipient twice updates its row"""
+        from send_email_app.delivery import DeliveryResult
+        from send_email_app.ledger import delivered_recipients, record_results
+        from send_email_app.models import MailDelivery
+        record_results('c1', [DeliveryResult('a@example.com', False, 429, None, 'slow down'),
+                              DeliveryResult('b@example.com', True, 200, 'uuid-b', None)])
+        record_results('c1', [DeliveryResult('a@example.com', True, 200, 'uuid-a', None)])
+        self.assertEqual(MailDelivery.objects.count(), 2)
+        self.assertEqual(delivered_recipients('c1', ['a@example.com', 'b@example.com', 'c@example.com']),
+                         {'a@example.com', 'b@example.com'})
+
+    def test_daily_purge_deletes_old_deliveries(self):
+        """Test the daily purge task deletes ledger rows past MAIL_DELIVERY_RETENTION_DAYS"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from send_email_app.delivery import DeliveryResult
+        from send_email_app.ledger import record_results
+        from send_email_app.models import MailDelivery
+        from send_email_app.tasks import purge_mail_payloads
+
+        record_results('old', [DeliveryResult('a@example.com', True, 200, 'uuid-a', None)])
+        MailDelivery.objects.update(created=timezone.now() - timedelta(days=8))
+        record_results('new', [DeliveryResult('a@example.com', True, 200, 'uuid-b', None)])
+        with self.settings(MAIL_DELIVERY_RETENTION_DAYS=7):
+            self.assertEqual(purge_mail_payloads.apply().get(), 'Deleted 0 payloads and 1 deliveries')
+        self.assertEqual(list(MailDelivery.objects.values_list('campaign', flat=True)), ['new'])
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_rerun_skips_delivered_recipients(self, mock_get_client):
+        """Test a second run of the same campaign sends nothing twice"""
+        from send_email_app.tasks import deliver_notifications
+        mock_get_client.return_value.send.side_effect = self.respond({'b@example.com': 400})
+        emails = ['a@example.com', 'b@example.com']
+        deliver_notifications(emails, 'H', 'C', campaign='c1')
+        report = deliver_notifications(emails, 'H', 'C', campaign='c1')
+        self.assertEqual((report.skipped, report.failed), (1, 1))
+        last_payload = mock_get_client.return_value.send.call_args.args[0]
+        self.assertEqual([m['To'][0]['Email'] for m in last_payload['Messages']], ['b@example.com'])
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_progress_completes_when_last_recipients_are_skipped(self, mock_get_client):
+        """Test the final progress update is sent even when no batch follows the skipped recipients"""
+        from clock_work.progress import ThrottledProgressRecorder
+        from send_email_app.delivery import DeliveryResult
+        from send_email_app.ledger import record_results
+        from send_email_app.tasks import deliver_notifications
+        mock_get_client.return_value.send.side_effect = self.respond({})
+        record_results('c1', [DeliveryResult(email, True, 200, 'uuid', None) for email in ('b@example.com', 'c@example.com')])
+        recorder = MagicMock()
+        # The batch of a is sent before b and c are looked at, no batch follows them
+        with self.settings(MAIL_JET_BATCH_SIZE=1):
+            deliver_notifications(['a@example.com', 'b@example.com', 'c@example.com'], 'H', 'C',
+                                  ThrottledProgressRecorder(recorder), campaign='c1')
+        recorder.set_progress.assert_called_with(3, 3, 'Sent notification to 3 of 3 recipients')
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_task_retries_only_transient_failures(self, mock_get_client):
+        """Test a 429 triggers a retry that resends only the throttled recipient"""
+        from send_email_app.models import MailDelivery
+        from send_email_app.tasks import send_mail_task
+        statuses = {'b@example.com': 429}
+        mock_get_client.return_value.send.side_effect = self.respond(statuses)
+        original = mock_get_client.return_value.send.side_effect
+
+        def send(data):
+            response = original(data)
+            statuses.clear()
+            return response
+
+        mock_get_client.return_value.send.side_effect = send
+        # Eager retries run inline, then report the original attempt as retried
+        send_mail_task.apply(args=[['a@example.com', 'b@example.com'], 'H', 'C'], throw=False)
+        payloads = [call.args[0]['Messages'] for call in mock_get_client.return_value.send.call_args_list]
+        self.assertEqual([[m['To'][0]['Email'] for m in p] for p in payloads],
+                         [['a@example.com', 'b@example.com'], ['b@example.com']])
+        self.assertEqual(MailDelivery.objects.filter(status=MailDelivery.SENT).count(), 2)
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_read_timeout_is_not_resent(self, mock_get_client):
+        """Test a read timeout, which Mailjet may have accepted, is recorded failed and not sent again"""
+        import requests
+        from send_email_app.models import MailDelivery
+        from send_email_app.tasks import send_mail_task
+        mock_get_client.return_value.send.side_effect = requests.ReadTimeout('read timed out')
+        result = send_mail_task.apply(args=[['a@example.com'], 'H', 'C'], throw=False)
+        self.assertTrue(result.successful())
+        self.assertEqual(mock_get_client.return_value.send.call_count, 1)
+        self.assertEqual(MailDelivery.objects.get(recipient='a@example.com').status, MailDelivery.FAILED)
+
+    def test_only_connect_errors_429_and_503_are_retryable(self):
+        """Test which failures may be sent again"""
+        import httpx
+        import requests
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+        from send_email_app.delivery import DeliveryResult, failed_results
+        from send_email_app.ledger import is_retryable
+
+        message = [{'To': [{'Email': 'a@example.com'}]}]
+        refused = requests.ConnectionError(MaxRetryError(None, '/send', NewConnectionError(None, 'refused')))
+        for exc, retryable in ((refused, True), (requests.ConnectTimeout('slow'), True),
+                               (httpx.ConnectError('refused'), True), (requests.ReadTimeout('slow'), False),
+                               (requests.ConnectionError('connection aborted'), False),
+                               (httpx.ReadTimeout('slow'), False)):
+            with self.subTest(exc=exc):
+                self.assertEqual(is_retryable(failed_results(message, exc)[0]), retryable)
+        for status_code, retryable in ((429, True), (503, True), (500, False), (502, False), (400, False)):
+            with self.subTest(status_code=status_code):
+                self.assertEqual(is_retryable(DeliveryResult('a@example.com', False, status_code, None, 'x')), retryable)
+
+
+class EmailBenchmarkTest(TestCase):
+    """Test the bulk-mail benchmark suite"""
+
+    def test_benchmark_reports_throughput_and_latency(self):
+        """Test a scenario run reports every message and cleans up its ledger rows"""
+        from send_email_app.benchmark import run_benchmark
+        from send_email_app.models import MailDelivery
+        from send_email_app.transports import FakeTransport
+
+        result = run_benchmark('send_mail_task', 120, FakeTransport(latency=0), trace_memory=True)
+        self.assertEqual(result['messages'], 120)
+        self.assertGreater(result['messages_per_second'], 0)
+        self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+        self.assertIsNotNone(result['peak_traced_memory_kb'])
+        self.assertFalse(MailDelivery.objects.exists())
+
+    def test_command_writes_json_report(self):
+        """Test the management command writes a machine-readable report"""
+        import os
+        import tempfile
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command('benchmark_email', scenario=['send_email_with_template'], recipients=[10],
+                         latency=0, output=path, stderr=MagicMock())
+            with open(path) as f:
+                report = json.load(f)
+        self.assertIn('batch_size', report['environment'])
+        self.assertEqual([(r['scenario'], r['messages']) for r in report['results']],
+                         [('send_email_with_template', 10)])
+
+    @patch('send_email_app.transports.get_fake_throttle')
+    def test_default_transport_is_not_rate_limited(self, mock_get_throttle):
+        """Test benchmark runs don't wait on the fake provider's rate limit by default"""
+        from send_email_app.benchmark import run_benchmark
+
+        with self.settings(FAKE_TRANSPORT_LATENCY=0):
+            run_benchmark('send_email_with_template', 3)
+        mock_get_throttle.assert_not_called()
+
+    @patch('send_email_app.tasks.record_results')
+    def test_async_task_reports_progress_from_worker_thread(self, mock_record):
+        """Test progress updates made off the task's thread still carry the task id"""
+        from send_email_app.benchmark import benchmark_recipients, use_transport
+        from send_email_app.tasks import async_send_mail_task
+        from send_email_app.transports import FakeTransport
+
+        with use_transport(FakeTransport(latency=0)):
+            result = async_send_mail_task.apply(args=(benchmark_recipients(120), 'H', 'C'))
+        self.assertEqual(result.get(), 'Done')
+        self.assertEqual(sum(len(call.args[1]) for call in mock_record.call_args_list), 120)
+
+    def test_find_regressions(self):
+        """Test throughput drops and p99 growth beyond the tolerance are flagged"""
+        from send_email_app.benchmark import find_regressions
+
+        def result(rate, p99):
+            return {'scenario': 's', 'recipients': 100, 'messages_per_second': rate, 'latency_ms': {'p99': p99}}
+
+        self.assertEqual(find_regressions([result(95, 10)], [result(100, 10)]), [])
+        self.assertEqual(len(find_regressions([result(80, 20)], [result(100, 10)])), 2)
+
+
+class RecipientCleaningTest(TestCase):
+    """Test recipient list normalisation before fan-out"""
+
+    def test_casefold_dedup_and_validate(self):
+        """Test addresses are case-folded, de-duplicated and syntax-checked"""
+        from send_email_app.recipients import clean_recipients
+
+        emails, dropped = clean_recipients('A@Example.com  a@example.com,b@example.com;not-an-email ')
+        self.assertEqual(emails, ['a@example.com', 'b@example.com'])
+        self.assertEqual(dropped, {'duplicate': ['a@example.com'], 'invalid': ['not-an-email'], 'suppressed': []})
+
+    def test_suppressed_addresses_are_dropped(self):
+        """Test addresses on the Redis suppression list are left out"""
+        import uuid
+        from send_email_app.recipients import clean_recipients
+        from send_email_app.suppression import suppress, unsuppress
+
+        with self.settings(EMAIL_SUPPRESSION_KEY=f'test:{uuid.uuid4().hex}'):
+            suppress('b@example.com')
+            self.addCleanup(unsuppress, 'b@example.com')
+            emails, dropped = clean_recipients(['a@example.com', 'B@example.com'], check_suppressed=True)
+        self.assertEqual(emails, ['a@example.com'])
+        self.assertEqual(dropped['suppressed'], ['b@example.com'])
+
+    @patch('send_email_app.views.send_mail_task.apply_async')
+    def test_send_mail_view_enqueues_cleaned_list(self, mock_apply):
+        """Test the view enqueues the cleaned list and reports what was dropped"""
+        mock_apply.return_value.task_id = 'task-1'
+        response = self.client.post(reverse('send_mail'), {
+            'headline': 'H', 'content': 'C', 'emails': 'a@example.com A@example.com  bad',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        from send_email_app.payloads import iter_payload_recipients
+        payload_id = mock_apply.call_args.kwargs['kwargs']['payload_id']
+        self.assertEqual(list(iter_payload_recipients(payload_id)), ['a@example.com'])
+        self.assertEqual(response.json()['dropped']['invalid'], ['bad'])
+
+    @patch('send_email_app.views.send_mail_task.apply_async')
+    def test_send_mail_view_rejects_empty_list(self, mock_apply):
+        """Test nothing is enqueued when no valid recipient is left"""
+        response = self.client.post(reverse('send_mail'), {'headline': 'H', 'content': 'C', 'emails': ' bad '},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        mock_apply.assert_not_called()
+
+
+class MailPayloadTest(TestCase):
+    """Test notification payloads passed to tasks by reference"""
+
+    def test_recipients_stream_back_in_order(self):
+        """Test stored recipients come back in insertion order across pages"""
+        from send_email_app.payloads import iter_payload_recipients, store_payload
+
+        emails = [f'user{i}@example.com' for i in range(25)]
+        payload = store_payload(emails, 'H', 'C')
+        self.assertEqual(payload.recipient_count, 25)
+        self.assertEqual(list(iter_payload_recipients(payload.pk, fetch_size=10)), emails)
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_task_sends_to_payload_recipients(self, mock_get_client):
+        """Test send_mail_task resolves a payload id to its recipients and body"""
+        from send_email_app.payloads import store_payload
+        from send_email_app.tasks import send_mail_task
+
+        def respond(data):
+            return MagicMock(status_code=200, json=MagicMock(return_value={'Messages': [
+                {'Status': 'success', 'To': [{'MessageUUID': '1'}]} for _ in data['Messages']
+            ]}))
+        mock_get_client.return_value.send.side_effect = respond
+
+        payload = store_payload(['a@example.com', 'b@example.com'], 'Headline', 'Body')
+        self.assertEqual(send_mail_task.apply(kwargs={'payload_id': payload.pk}).get(), 'Done')
+        messages = mock_get_client.return_value.send.call_args.args[0]['Messages']
+        self.assertEqual([m['To'][0]['Email'] for m in messages], ['a@example.com', 'b@example.com'])
+        self.assertEqual(messages[0]['Subject'], 'Headline')
+
+    def test_schedule_stores_reference(self):
+        """Test ScheduleMail keeps only the payload id in the reminder"""
+        from notifications_app.models import Reminder
+        from send_email_app.models import MailPayload
+        from send_email_app.payloads import scheduled_payloads
+
+        response = self.client.post(reverse('schedule_mail'), {
+            'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        reminder = Reminder.objects.get(name__startswith='schedule_mail_task_')
+        self.assertEqual(reminder.args, [])
+        self.assertEqual(list(reminder.kwargs), ['payload_id'])
+        self.assertEqual(reminder.task, 'clock_work.send_email_app.send_mail_task_with_schedule')
+        self.assertEqual(list(MailPayload.objects.filter(scheduled_payloads()).values_list('pk', flat=True)),
+                         [reminder.kwargs['payload_id']])
+
+    def test_schedule_uses_the_user_timezone(self):
+        """Test ScheduleMail reads the time in the posted zone and remembers it for the session"""
+        from notifications_app.models import Reminder
+
+        response = self.client.post(reverse('schedule_mail'), {
+            'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T09:00',
+            'timezone': 'America/New_York',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session['django_timezone'], 'America/New_York')
+        self.client.post(reverse('schedule_mail'), {
+            'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00',
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual([str(r.due_at) for r in Reminder.objects.order_by('due_at')],
+                         ['2030-01-01 14:00:00+00:00', '2030-01-01 15:00:00+00:00'])
+
+    def test_schedule_rejects_bad_times(self):
+        """Test an unparseable time or unknown zone is a 400, not a server error"""
+        for extra in ({'datetime': 'soon'}, {'datetime': '2030-01-01T09:00', 'timezone': 'Mars/Base'}):
+            response = self.client.post(reverse('schedule_mail'), dict({
+                'headline': 'H', 'content': 'C', 'emails': 'a@example.com'}, **extra),
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 400)
+
+    def test_schedule_names_are_unique(self):
+        """Test scheduled mails get distinct names even after one was deleted"""
+        from django_celery_beat.models import PeriodicTask
+
+        data = {'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00'}
+        with self.settings(REMINDER_BACKEND='beat'):
+            for _ in range(2):
+                self.client.post(reverse('schedule_mail'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            PeriodicTask.objects.filter(name__startswith='schedule_mail_task_').first().delete()
+            response = self.client.post(reverse('schedule_mail'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PeriodicTask.objects.filter(name__startswith='schedule_mail_task_').count(), 2)
+
+    def test_failed_schedule_keeps_no_payload(self):
+        """Test the payload is rolled back when the schedule cannot be created"""
+        from send_email_app.models import MailPayload
+
+        with patch('send_email_app.views.schedule_once', side_effect=ValueError('boom')):
+            response = self.client.post(reverse('schedule_mail'), {
+                'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00',
+            }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MailPayload.objects.exists())
+
+    def test_schedule_with_beat_backend(self):
+        """Test ScheduleMail creates a one-off clocked periodic task with the beat backend"""
+        from django_celery_beat.models import PeriodicTask
+
+        with self.settings(REMINDER_BACKEND='beat'):
+            self.client.post(reverse('schedule_mail'), {
+                'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00',
+            }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        task = PeriodicTask.objects.get(name__startswith='schedule_mail_task_')
+        self.assertIn('payload_id', json.loads(task.kwargs))
+        self.assertTrue(task.one_off)
+        self.assertEqual(task.task, 'clock_work.send_email_app.send_mail_task_with_schedule')
+
+    def test_purge_keeps_scheduled_payloads(self):
+        """Test old payloads are purged unless an enabled schedule or a pending reminder refers to them"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from django_celery_beat.models import IntervalSchedule, PeriodicTask
+        from send_email_app.models import MailPayload
+        from send_email_app.payloads import purge_payloads, store_payload
+
+        from notifications_app.models import Reminder
+
+        old, scheduled = store_payload(['a@example.com'], 'H', 'C'), store_payload(['b@example.com'], 'H', 'C')
+        reminded, fired = store_payload(['c@example.com'], 'H', 'C'), store_payload(['d@example.com'], 'H', 'C')
+        MailPayload.objects.update(created=timezone.now() - timedelta(days=60))
+        PeriodicTask.objects.create(name='t', task='x', kwargs=json.dumps({'payload_id': scheduled.pk}),
+                                    interval=IntervalSchedule.objects.create(every=1, period='days'))
+        Reminder.objects.create(name='r1', task='x', due_at=timezone.now(), kwargs={'payload_id': reminded.pk})
+        Reminder.objects.create(name='r2', task='x', due_at=timezone.now(), kwargs={'payload_id': fired.pk},
+                                status=Reminder.DISPATCHED)
+        self.assertEqual(purge_payloads(retention_days=30), 2)
+        self.assertEqual(sorted(MailPayload.objects.values_list('pk', flat=True)), [scheduled.pk, reminded.pk])
+
+    def test_bulk_schedule_returns_ids(self):
+        """Test BulkScheduleMail stores every payload and returns the created reminder ids"""
+        from notifications_app.models import Reminder
+        from send_email_app.models import MailPayload
+
+        reminders = [{'headline': f'H{i}', 'content': 'C', 'emails': [f'user{i}@example.com', 'bad'],
+                      'datetime': '2030-01-01T10:00'} for i in range(3)]
+        response = self.client.post(reverse('bulk_schedule_mail'), json.dumps(reminders),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(data['ids']), sorted(Reminder.objects.values_list('pk', flat=True)))
+        self.assertEqual([dropped['invalid'] for dropped in data['dropped']], [['bad']] * 3)
+        self.assertEqual(MailPayload.objects.count(), 3)
+        payload_ids = {reminder.kwargs['payload_id'] for reminder in Reminder.objects.all()}
+        self.assertEqual(payload_ids, set(MailPayload.objects.values_list('pk', flat=True)))
+
+    def test_bulk_schedule_reuses_clocked_schedules(self):
+        """Test the beat backend shares one ClockedSchedule per time, including existing ones"""
+        from django_celery_beat.models import ClockedSchedule, PeriodicTask
+        from clock_work.scheduling import schedule_once
+
+        with self.settings(REMINDER_BACKEND='beat'):
+            existing = schedule_once('existing', 'x', datetime.datetime(2030, 1, 1, 10, 0))
+            reminders = [{'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': when}
+                         for when in ('2030-01-01T10:00', '2030-01-01T10:00', '2030-01-02T10:00')]
+            response = self.client.post(reverse('bulk_schedule_mail'), json.dumps(reminders),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ClockedSchedule.objects.count(), 2)
+        tasks = PeriodicTask.objects.filter(pk__in=response.json()['ids'])
+        self.assertEqual(len(tasks), 3)
+        self.assertEqual(sum(task.clocked_id == existing.clocked_id for task in tasks), 2)
+
+    def test_bulk_schedule_rejects_invalid_items(self):
+        """Test one invalid reminder fails the whole request and nothing is stored"""
+        from notifications_app.models import Reminder
+        from send_email_app.models import MailPayload
+
+        reminders = [{'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00'},
+                     {'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': 'tomorrow'},
+                     {'headline': 'H', 'content': 'C', 'emails': 'nobody', 'datetime': '2030-01-01T10:00'}]
+        response = self.client.post(reverse('bulk_schedule_mail'), json.dumps(reminders),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'1', '2'})
+        self.assertFalse(MailPayload.objects.exists())
+        self.assertFalse(Reminder.objects.exists())
+
+    def test_bulk_schedule_validates_field_types(self):
+        """Test malformed headlines, contents, emails and zones are per-item errors, not server errors"""
+        from send_email_app.models import MailPayload
+
+        valid = {'headline': 'H', 'content': 'C', 'emails': 'a@example.com', 'datetime': '2030-01-01T10:00'}
+        cases = [
+            {'headline': None}, {'headline': ''}, {'headline': 42}, {'headline': 'H' * 256},
+            {'content': None}, {'content': ['C']},
+            {'emails': [1, 2]}, {'emails': {'a@example.com': 1}}, {'emails': None},
+            {'timezone': 5}, {'timezone': ['UTC']},
+        ]
+        for changes in cases:
+            reminder = dict(valid, **changes)
+            if changes.get('headline', 'H') is None:
+                del reminder['headline']
+            with self.subTest(changes=changes):
+                response = self.client.post(reverse('bulk_schedule_mail'), json.dumps([valid, reminder]),
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.json()['errors']), ['1'])
+        self.assertFalse(MailPayload.objects.exists())
+
+        response = self.client.post(reverse('bulk_schedule_mail'), json.dumps([
+            dict(valid, headline='H' * 255, emails=['a@example.com'], timezone='Europe/London')
+        ]), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class DeliveryMetricsTest(TestCase):
+    """Test the Prometheus metrics recorded by the mail pipeline"""
+
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_task_counts_messages_by_status(self, mock_get_client):
+        """Test send_mail_task counts sent and failed messages with their status code"""
+        from send_email_app.tasks import send_mail_task
+
+        mock_get_client.return_value.send.return_value = MagicMock(status_code=200, json=MagicMock(return_value={
+            'Messages': [
+                {'Status': 'success', 'To': [{'MessageUUID': '1'}]},
+                {'Status': 'error', 'Errors': [{'StatusCode': 400, 'ErrorMessage': 'bad'}]},
+            ]
+        }))
+        sent = dict(template='notification_email', status='sent', status_code='200')
+        failed = dict(template='notification_email', status='failed', status_code='400')
+        before = self.sample('clock_work_email_messages_total', **sent), self.sample('clock_work_email_messages_total', **failed)
+        requests_before = self.sample('clock_work_email_provider_request_seconds_count', transport='MailjetTransport')
+        runs_before = self.sample('clock_work_email_task_recipients_count', task='clock_work.send_email_app.send_mail_task')
+
+        send_mail_task.apply(args=[['a@example.com', 'b@example.com'], 'H', 'C'])
+
+        self.assertEqual(self.sample('clock_work_email_messages_total', **sent), before[0] + 1)
+        self.assertEqual(self.sample('clock_work_email_messages_total', **failed), before[1] + 1)
+        self.assertEqual(self.sample('clock_work_email_provider_request_seconds_count', transport='MailjetTransport'),
+                         requests_before + 1)
+        self.assertEqual(self.sample('clock_work_email_task_recipients_count',
+                                     task='clock_work.send_email_app.send_mail_task'), runs_before + 1)
+
+    def test_render_is_timed_per_template(self):
+        """Test render_email observes the render time under its template name"""
+        from send_email_app.rendering import render_email
+
+        before = self.sample('clock_work_email_render_seconds_count', template='notification_email')
+        render_email('notification_email', {'headline': 'H', 'content': 'C'})
+        self.assertEqual(self.sample('clock_work_email_render_seconds_count', template='notification_email'), before + 1)
+
+    def test_retries_of_mail_tasks_are_counted(self):
+        """Test the task_retry signal increments the retry counter for mail tasks only"""
+        from celery.signals import task_retry
+        from send_email_app.tasks import send_mail_task
+        from clock_work.tasks import test_func
+
+        before = self.sample('clock_work_email_task_retries_total', task=send_mail_task.name)
+        task_retry.send(sender=send_mail_task, request=None, reason='x', einfo=None)
+        task_retry.send(sender=test_func, request=None, reason='x', einfo=None)
+        self.assertEqual(self.sample('clock_work_email_task_retries_total', task=send_mail_task.name), before + 1)
+        self.assertEqual(self.sample('clock_work_email_task_retries_total', task=test_func.name), 0)
+
+
+class InlinedEmailTemplateTest(TestCase):
+    """Test the CSS-inlined email templates"""
+
+    def test_inline_css_follows_the_cascade(self):
+        """Test rules are inlined by specificity, inline styles win and pseudo-classes are skipped"""
+        from send_email_app.inlining import inline_css
+
+        html = inline_css(
+            '<style>p { color: red; margin: 0 } .note p { color: blue } a:hover { color: green }'
+            '@media (max-width: 600px) { p { color: black } }</style>'
+            '<div class="note"><p style="margin: 4px">x</p></div><a href="#">y</a>'
+        )
+        self.assertIn('<p style="color: blue; margin: 4px">x</p>', html)
+        self.assertIn('<a href="#">y</a>', html)
+        self.assertIn('@media', html)
+
+    def test_inline_css_keeps_template_syntax(self):
+        """Test comparison operators and ampersands inside template tags are not HTML-escaped"""
+        from django.template import Context, engines
+        from send_email_app.inlining import inline_css
+
+        source = inline_css(
+            '<style>p { color: red }</style>{# a < b & c #}'
+            '<p title="{{ t|default:"x & y" }}" {% if n > 1 %}hidden{% endif %}>'
+            '{% if n > 1 and n < 5 %}{{ x|default:"A & B" }}{% endif %} &amp; done</p>'
+        )
+        self.assertIn('{% if n > 1 and n < 5 %}{{ x|default:"A & B" }}{% endif %}', source)
+        self.assertIn('{% if n > 1 %}hidden{% endif %}', source)
+        html = engines['django'].from_string(source).render({'n': 2})
+        # Literal filter arguments are not autoescaped, the output matches the original template's
+        self.assertIn('A & B &amp; done', html)
+        self.assertIn('title="x & y"', html)
+        self.assertIn(' hidden', html)
+        self.assertIn('style="color: red"', html)
+
+    def test_uncompilable_inlined_template_falls_back(self):
+        """Test a template whose inlined version does not compile is sent without inlined CSS"""
+        from django.template import TemplateSyntaxError
+        from send_email_app.rendering import clear_template_cache, get_email_template
+
+        clear_template_cache()
+        self.addCleanup(clear_template_cache)
+        with patch('send_email_app.rendering.inlined_template', side_effect=TemplateSyntaxError('bad')):
+            template = get_email_template('emails/welcome_email.html')
+        self.assertEqual(template.origin.template_name, 'emails/welcome_email.html')
+
+    def test_rendered_email_has_inline_styles(self):
+        """Test render_email uses the flattened, inlined template and still fills in the context"""
+        import tempfile
+        from send_email_app.rendering import clear_template_cache, render_email
+
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(EMAIL_TEMPLATE_CACHE_DIR=cache_dir):
+            clear_template_cache()
+            html, _ = render_email('notification_email', {'headline': 'Hi', 'content': 'Body', 'user_email': 'a@b.c'})
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        clear_template_cache()
+        self.assertRegex(html, r'<h2 style="[^"]*font-size: 24px[^"]*">Hello a@b.c!</h2>')
+        self.assertIn('<h1 style="margin: 0;', html)
+        self.assertIn('Body', html)
+
+    def test_cached_template_is_reused_until_sources_change(self):
+        """Test a cached inlined template is read back instead of inlined again"""
+        import tempfile
+        from send_email_app.inlining import build_inlined_source
+
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(EMAIL_TEMPLATE_CACHE_DIR=cache_dir):
+            _, path = build_inlined_source('emails/welcome_email.html')
+            with open(path, 'w') as cached:
+                cached.write('cached')
+            with patch('send_email_app.inlining.inline_css') as mock_inline:
+                self.assertEqual(build_inlined_source('emails/welcome_email.html'), ('cached', path))
+            mock_inline.assert_not_called()
+
+    def test_build_command_prunes_stale_templates(self):
+        """Test build_email_templates builds every email and removes stale cache files"""
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+
+        with tempfile.TemporaryDirectory() as cache_dir, self.settings(EMAIL_TEMPLATE_CACHE_DIR=cache_dir):
+            open(os.path.join(cache_dir, 'emails__welcome_email.html.stale'), 'w').close()
+            call_command('build_email_templates', '--prune', stdout=StringIO())
+            files = sorted(os.listdir(cache_dir))
+        self.assertEqual([file.rsplit('.', 1)[0] for file in files], [
+            'emails__base_email.html', 'emails__notification_email.html', 'emails__welcome_email.html',
+        ])
+
+
+class MailCheckpointTest(TestCase):
+    """Test checkpointed, resumable bulk sends"""
+
+    def setUp(self):
+        from send_email_app.payloads import store_payload
+        self.emails = [f'user{i}@example.com' for i in range(6)]
+        self.payload = store_payload(self.emails, 'H', 'C')
+        self.sent = []
+
+    def respond(self, data):
+        self.sent.extend(message['To'][0]['Email'] for message in data['Messages'])
+        return MagicMock(status_code=200, json=MagicMock(return_value={'Messages': [
+            {'Status': 'success', 'To': [{'MessageUUID': '1'}]} for _ in data['Messages']
+        ]}))
+
+    def test_recipients_stream_from_start(self):
+        """Test payload recipients can be streamed from a position"""
+        from send_email_app.payloads import iter_payload_recipients
+        self.assertEqual(list(iter_payload_recipients(self.payload.pk, fetch_size=2, start=3)), self.emails[3:])
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_interrupted_send_resumes_from_checkpoint(self, mock_get_client):
+        """Test a send killed mid-way is resumed after the last checkpoint without resending"""
+        from send_email_app.models import MailCheckpoint
+        from send_email_app.tasks import resume_bulk_send, send_mail_task
+
+        calls = []
+
+        def die_on_third_request(data):
+            calls.append(data)
+            if len(calls) == 3:
+                raise SystemExit('worker killed')
+            return self.respond(data)
+        mock_get_client.return_value.send.side_effect = die_on_third_request
+
+        with self.settings(MAIL_JET_BATCH_SIZE=2, MAIL_CHECKPOINT_INTERVAL=2):
+            with self.assertRaises(SystemExit):
+                send_mail_task.apply(kwargs={'payload_id': self.payload.pk}, task_id='campaign-1')
+            checkpoint = MailCheckpoint.objects.get(campaign='campaign-1')
+            self.assertEqual((checkpoint.status, checkpoint.position, checkpoint.sent), (MailCheckpoint.RUNNING, 4, 4))
+
+            mock_get_client.return_value.send.side_effect = self.respond
+            # The killed run's heartbeat is still fresh, it might be alive
+            self.assertEqual(resume_bulk_send.apply(args=['campaign-1']).get(), 'campaign-1 is still running')
+            self.assertEqual(self.sent, self.emails[:4])
+            self.make_stale(checkpoint)
+            with patch('send_email_app.tasks.AsyncResult') as mock_result:
+                mock_result.return_value.state = 'RETRY'
+                self.assertEqual(resume_bulk_send.apply(args=['campaign-1']).get(), 'campaign-1 is still running')
+                mock_result.return_value.state = 'PENDING'
+                resume_bulk_send.apply(args=['campaign-1'])
+
+        self.assertEqual(self.sent, self.emails)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.status, checkpoint.position, checkpoint.sent), (MailCheckpoint.COMPLETED, 6, 6))
+
+    def make_stale(self, checkpoint):
+        from datetime import timedelta
+        from django.utils import timezone
+        from send_email_app.models import MailCheckpoint
+        MailCheckpoint.objects.filter(pk=checkpoint.pk).update(heartbeat=timezone.now() - timedelta(minutes=10))
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_run_does_not_start_while_another_is_alive(self, mock_get_client):
+        """Test a second run of a send with a live owner sends nothing and retries later"""
+        from celery.exceptions import Retry
+        from send_email_app.models import CheckpointBusy, MailCheckpoint
+        from send_email_app.tasks import send_mail_task
+
+        mock_get_client.return_value.send.side_effect = self.respond
+        MailCheckpoint.claim('campaign-3', send_mail_task.name, self.payload.pk, owner='worker-1:a')
+        with patch.object(send_mail_task, 'retry', side_effect=Retry) as mock_retry:
+            with self.assertRaises(Retry):
+                send_mail_task.apply(kwargs={'payload_id': self.payload.pk}, task_id='campaign-3', throw=True)
+        self.assertIsInstance(mock_retry.call_args.kwargs['exc'], CheckpointBusy)
+        self.assertEqual(self.sent, [])
+
+    def test_taken_over_run_stops(self):
+        """Test a run whose stale checkpoint was claimed by another run can no longer save progress"""
+        from send_email_app.models import CheckpointBusy, MailCheckpoint
+        from send_email_app.tasks import DeliveryReport
+
+        first = MailCheckpoint.claim('campaign-4', 'task', self.payload.pk, owner='worker-1:a')
+        with self.assertRaises(CheckpointBusy):
+            MailCheckpoint.claim('campaign-4', 'task', self.payload.pk, owner='worker-2:b')
+        self.make_stale(first)
+        MailCheckpoint.claim('campaign-4', 'task', self.payload.pk, owner='worker-2:b')
+        with self.assertRaises(CheckpointBusy):
+            first.save_progress(DeliveryReport(6))
+        with self.assertRaises(CheckpointBusy):
+            first.touch()
+
+    def test_admin_resumes_only_dead_sends(self):
+        """Test the admin action reports the sends it left alone"""
+        from django.contrib.admin.sites import site
+        from send_email_app.models import MailCheckpoint
+
+        MailCheckpoint.claim('campaign-5', 'task', self.payload.pk, owner='worker-1:a')
+        with patch('send_email_app.admin.resume_checkpoint', return_value=None):
+            admin = site._registry[MailCheckpoint]
+            with patch.object(admin, 'message_user') as mock_message:
+                admin.resume_sends(None, MailCheckpoint.objects.all())
+        self.assertEqual([call.args[1] for call in mock_message.call_args_list],
+                         ['Resumed 0 sends', 'Skipped 1 sends that are still running'])
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_completed_send_is_not_repeated(self, mock_get_client):
+        """Test a redelivered task whose send completed sends nothing"""
+        from send_email_app.tasks import send_mail_task
+
+        mock_get_client.return_value.send.side_effect = self.respond
+        send_mail_task.apply(kwargs={'payload_id': self.payload.pk}, task_id='campaign-2')
+        send_mail_task.apply(kwargs={'payload_id': self.payload.pk}, task_id='campaign-2')
+        self.assertEqual(self.sent, self.emails)
+
+
+class MailjetEventsTest(TestCase):
+    """Test Mailjet event ingestion and the suppression index"""
+
+    def setUp(self):
+        import uuid
+        settings_override = self.settings(EMAIL_SUPPRESSION_KEY=f'test:{uuid.uuid4().hex}', MAIL_JET_WEBHOOK_TOKEN='secret')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def post_events(self, events, path=None):
+        path = path or reverse('mailjet_events') + '?token=secret'
+        return self.client.post(path, json.dumps(events), content_type='application/json')
+
+    def test_event_batch_is_stored_and_suppresses(self):
+        """Test hard bounces, spam and unsubscribes suppress, soft bounces and opens do not"""
+        from send_email_app.models import MailEvent, SuppressedRecipient
+        from send_email_app.suppression import suppressed_recipients
+
+        events = [
+            {'event': 'bounce', 'email': 'Hard@example.com', 'time': 1700000000, 'MessageID': 1, 'hard_bounce': True,
+             'error_related_to': 'recipient', 'error': 'user unknown'},
+            {'event': 'bounce', 'email': 'soft@example.com', 'time': 1700000000, 'MessageID': 2, 'hard_bounce': False},
+            {'event': 'spam', 'email': 'spam@example.com', 'time': 1700000001, 'MessageID': 3},
+            {'event': 'open', 'email': 'open@example.com', 'time': 1700000002, 'MessageID': 4},
+            {'event': 'unsub', 'email': 'unsub@example.com'},
+        ]
+        self.assertEqual(self.post_events(events).status_code, 200)
+        self.assertEqual(self.post_events(events[0]).status_code, 200)
+
+        self.assertEqual(MailEvent.objects.count(), 4)
+        self.assertEqual(MailEvent.objects.get(email='hard@example.com').error, 'recipient: user unknown')
+        self.assertEqual(set(SuppressedRecipient.objects.values_list('email', 'reason')),
+                         {('hard@example.com', 'bounce'), ('spam@example.com', 'spam')})
+        self.assertEqual(suppressed_recipients(['HARD@example.com', 'soft@example.com', 'spam@example.com']),
+                         {'HARD@example.com', 'spam@example.com'})
+
+    def test_webhook_token_required(self):
+        """Test the webhook rejects requests without the configured token, and all of them without one"""
+        from send_email_app.models import SuppressedRecipient
+
+        unsub = [{'event': 'unsub', 'email': 'victim@example.com'}]
+        self.assertEqual(self.post_events(unsub, reverse('mailjet_events')).status_code, 403)
+        self.assertEqual(self.post_events(unsub, reverse('mailjet_events') + '?token=wrong').status_code, 403)
+        with self.settings(MAIL_JET_WEBHOOK_TOKEN=''):
+            self.assertEqual(self.post_events(unsub, reverse('mailjet_events') + '?token=').status_code, 403)
+            self.assertEqual(self.post_events(unsub, reverse('mailjet_events')).status_code, 403)
+        self.assertFalse(SuppressedRecipient.objects.exists())
+        self.assertEqual(self.post_events([]).status_code, 200)
+
+    @patch('send_email_app.transports.get_mailjet_client')
+    def test_bulk_send_skips_suppressed_before_rendering(self, mock_get_client):
+        """Test send_mail_task leaves out suppressed recipients and counts them as skipped"""
+        from send_email_app.suppression import suppress
+        from send_email_app.tasks import deliver_notifications
+
+        mock_get_client.return_value.send.return_value = MagicMock(status_code=200, json=MagicMock(return_value={
+            'Messages': [{'Status': 'success', 'To': [{'MessageUUID': '1'}]}]
+        }))
+        suppress('dead@example.com')
+        report = deliver_notifications(['dead@example.com', 'live@example.com'], 'H', 'C')
+        messages = mock_get_client.return_value.send.call_args.args[0]['Messages']
+        self.assertEqual([m['To'][0]['Email'] for m in messages], ['live@example.com'])
+        self.assertEqual(report.as_dict(), {'sent': 1, 'failed': 0, 'skipped': 1})
+
+    def test_rebuild_index_from_table(self):
+        """Test rebuild_suppression_index replaces the Redis set with the table contents"""
+        from io import StringIO
+        from django.core.management import call_command
+        from send_email_app.models import SuppressedRecipient
+        from send_email_app.suppression import suppress, suppressed_recipients
+
+        suppress('stale@example.com')
+        SuppressedRecipient.objects.create(email='kept@example.com', reason='spam')
+        call_command('rebuild_suppression_index', stdout=StringIO())
+        self.assertEqual(suppressed_recipients(['stale@example.com', 'kept@example.com']), {'kept@example.com'})
@@ -0,0 +1,152 @@
+"""
+Cluster-wide rate limiting of Mailjet API calls.
+
+Every Celery worker (and the web process) draws from one token bucket kept
+in Redis, so together they stay under the provider's per-second limit
+instead of each looping at full speed. When Mailjet still answers 429 the
+shared refill rate is cut for a cool-down period and, if the response said
+how long to wait, every sender pauses for that long.
+"""
+import time
+
+import redis
+from django.conf import settings
+
+# KEYS: bucket hash, rate factor, pause marker
+# ARGV: rate (tokens/s), capacity, tokens requested
+# Returns 0 when the tokens were taken, otherwise milliseconds to wait.
+ACQUIRE_SCRIPT = """
+local paused = redis.call('PTTL', KEYS[3])
+if paused > 0 then
+    return paused
+end
+local factor = tonumber(redis.call('GET', KEYS[2]) or '1')
+local rate = tonumber(ARGV[1]) * factor
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return wait
+"""
+
+# KEYS: rate factor
+# ARGV: multiplier, floor, cool-down seconds
+BACKOFF_SCRIPT = """
+local factor = tonumber(redis.call('GET', KEYS[1]) or '1')
+factor = math.max(tonumber(ARGV[2]), factor * tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], tostring(factor), 'EX', tonumber(ARGV[3]))
+return tostring(factor)
+"""
+
+
+class TokenBucket:
+    """
+    Distributed token bucket refilled at ``rate`` tokens per second.
+
+    ``backoff`` multiplies the refill rate by ``backoff_factor`` (down to
+    ``min_factor``) for ``cooldown`` seconds; repeated 429s keep halving it
+    and the full rate comes back once they stop.
+    """
+
+    def __init__(self, redis_url, key, rate, capacity=None, backoff_factor=0.5, min_factor=0.1, cooldown=60):
+        self.redis_url = redis_url
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.backoff_factor = backoff_factor
+        self.min_factor = min_factor
+        self.cooldown = cooldown
+        self._redis = None
+        self._acquire = None
+        self._backoff = None
+
+    def connect(self):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self.redis_url)
+            self._acquire = self._redis.register_script(ACQUIRE_SCRIPT)
+            self._backoff = self._redis.register_script(BACKOFF_SCRIPT)
+        return self._redis
+
+    @property
+    def keys(self):
+        return [f'{self.key}:bucket', f'{self.key}:factor', f'{self.key}:paused']
+
+    def try_acquire(self, tokens=1):
+        """Take ``tokens`` if available; return 0 or the seconds to wait first."""
+        self.connect()
+        return self._acquire(keys=self.keys, args=[self.rate, self.capacity, tokens]) / 1000.0
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` have been taken from the bucket."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def backoff(self, retry_after=None):
+        """Slow every sender down after a 429, pausing them for ``retry_after`` seconds if given."""
+        redis_client = self.connect()
+        factor = float(self._backoff(keys=self.keys[1:2], args=[self.backoff_factor, self.min_factor, self.cooldown]))
+        if retry_after:
+            redis_client.set(self.keys[2], 1, px=int(retry_after * 1000))
+        return factor
+
+
+class NoThrottle:
+    """Stand-in used when MAIL_JET_RATE_LIMIT is 0."""
+
+    def acquire(self, tokens=1):
+        pass
+
+    def backoff(self, retry_after=None):
+        pass
+
+
+_throttle = None
+_fake_throttle = None
+
+
+def build_throttle(key):
+    """Return a throttle at the MAIL_JET_RATE_LIMIT settings stored under ``key``."""
+    rate = getattr(settings, 'MAIL_JET_RATE_LIMIT', 0)
+    if not rate:
+        return NoThrottle()
+    return TokenBucket(
+        settings.REDIS_CLOUD_URL,
+        key,
+        rate,
+        capacity=getattr(settings, 'MAIL_JET_RATE_LIMIT_BURST', None),
+        cooldown=getattr(settings, 'MAIL_JET_RATE_LIMIT_COOLDOWN', 60),
+    )
+
+
+def get_mailjet_throttle():
+    """Return the process-wide throttle for Mailjet calls configured from settings."""
+    global _throttle
+    if _throttle is None:
+        _throttle = build_throttle(f'{settings.PROJECT_NAME}:mailjet')
+    return _throttle
+
+
+def get_fake_throttle():
+    """
+    Return the throttle of FakeTransport: the same settings as the Mailjet
+    one but its own bucket, so simulated 429s never slow real senders.
+    """
+    global _fake_throttle
+    if _fake_throttle is None:
+        _fake_throttle = build_throttle(f'{settings.PROJECT_NAME}:mailjet:fake')
+    return _fake_throttle
@@ -0,0 +1,185 @@
+"""
+Pluggable transports that deliver batches of rendered emails.
+
+Messages are passed around in the Mailjet v3.1 Send API shape (``From``,
+``To``, ``Subject``, ``TextPart``, ``HTMLPart``, ``CustomID``) and every
+transport answers with one ``DeliveryResult`` per message. The transport
+in use is picked with the EMAIL_TRANSPORT setting:
+
+* ``MailjetTransport`` - the Mailjet Send API (default).
+* ``DjangoEmailTransport`` - whatever Django's EMAIL_BACKEND is.
+* ``FakeTransport`` - an in-process stand-in for Mailjet with configurable
+  latency, error rate and 429s, for benchmarking without sending mail.
+"""
+import asyncio
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from functools import partial
+
+import httpx
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .async_delivery import send_batch_async
+from .delivery import DeliveryResult, failed_results, message_recipient, parse_send_response
+from .mailjet_client import get_mailjet_client
+from .throttle import get_fake_throttle
+
+
+def format_address(address):
+    name = address.get('Name')
+    return f'{name} <{address["Email"]}>' if name else address['Email']
+
+
+class EmailTransport:
+    """Base class; subclasses implement ``send_batch``."""
+
+    def send_batch(self, messages):
+        """Send ``messages`` and return a ``DeliveryResult`` for each, in order."""
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def async_sender(self, concurrency):
+        """
+        Yield a coroutine function sending one batch, usable by up to
+        ``concurrency`` tasks at once. By default ``send_batch`` runs in a
+        worker thread.
+        """
+        yield partial(asyncio.to_thread, self.send_batch)
+
+
+class MailjetTransport(EmailTransport):
+    """Mailjet Send API through the shared pooled client."""
+
+    def __init__(self, http_transport=None):
+        # http_transport is handed to httpx.AsyncClient, mainly for tests
+        self.http_transport = http_transport
+
+    def send_batch(self, messages):
+        try:
+            result = get_mailjet_client().send({'Messages': messages})
+        except Exception as e:
+            return failed_results(messages, e)
+
+        try:
+            body = result.json()
+        except ValueError:
+            body = {}
+        return parse_send_response(messages, result.status_code, body)
+
+    @asynccontextmanager
+    async def async_sender(self, concurrency):
+        mailjet = get_mailjet_client()
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        timeout = httpx.Timeout(mailjet.timeout[1], connect=mailjet.timeout[0])
+        async with httpx.AsyncClient(auth=mailjet.auth, timeout=timeout, limits=limits,
+                                     transport=self.http_transport) as client:
+            yield partial(send_batch_async, client, mailjet.send_url)
+
+
+class DjangoEmailTransport(EmailTransport):
+    """Django's configured EMAIL_BACKEND, one connection per batch."""
+
+    def build_email(self, message):
+        email = EmailMultiAlternatives(
+            subject=message.get('Subject', ''),
+            body=message.get('TextPart', ''),
+            from_email=format_address(message['From']),
+            to=[format_address(address) for address in message['To']],
+            headers={'X-MJ-CustomID': message['CustomID']} if message.get('CustomID') else None,
+        )
+        if message.get('HTMLPart'):
+            email.attach_alternative(message['HTMLPart'], 'text/html')
+        return email
+
+    def send_batch(self, messages):
+        results = []
+        try:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+        except Exception as e:
+            # Nothing was handed to the SMTP server yet
+            return failed_results(messages, e, connect_error=True)
+        try:
+            for message in messages:
+                email = message_recipient(message)
+                try:
+                    connection.send_messages([self.build_email(message)])
+                except Exception as e:
+                    results.append(DeliveryResult(email, False, None, None, str(e)))
+                else:
+                    results.append(DeliveryResult(email, True, None, None, None))
+        finally:
+            connection.close()
+        return results
+
+
+class FakeTransport(EmailTransport):
+    """
+    Stand-in for the Mailjet Send API that sends nothing.
+
+    Each batch takes ``latency`` seconds (+/- ``jitter`` of it), is answered
+    with a 429 with probability ``rate_limited_rate``, and otherwise each
+    message fails with probability ``error_rate``. Like the real transport it
+    goes through a throttle, so rate limiting can be tuned offline; by
+    default its own bucket (``get_fake_throttle``), never the production one.
+    """
+
+    def __init__(self, latency=None, jitter=0.5, error_rate=None, rate_limited_rate=None, retry_after=1, seed=None,
+                 throttle=None):
+        if latency is None:
+            latency = getattr(settings, 'FAKE_TRANSPORT_LATENCY', 0.2)
+        if error_rate is None:
+            error_rate = getattr(settings, 'FAKE_TRANSPORT_ERROR_RATE', 0.0)
+        if rate_limited_rate is None:
+            rate_limited_rate = getattr(settings, 'FAKE_TRANSPORT_RATE_LIMITED_RATE', 0.0)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limited_rate = rate_limited_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.throttle = throttle
+
+    def delay(self):
+        return max(0.0, self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def respond(self, messages):
+        """Return the (status code, body) Mailjet would answer ``messages`` with."""
+        if self.random.random() < self.rate_limited_rate:
+            return 429, {'ErrorMessage': 'Too many requests (simulated)'}
+        entries = []
+        for message in messages:
+            if self.random.random() < self.error_rate:
+                entries.append({'Status': 'error', 'Errors': [{'StatusCode': 400, 'ErrorMessage': 'Simulated error'}]})
+            else:
+                entries.append({'Status': 'success', 'To': [{'Email': message_recipient(message),
+                                                             'MessageUUID': str(uuid.uuid4())}]})
+        return 200, {'Messages': entries}
+
+    def get_throttle(self):
+        return self.throttle or get_fake_throttle()
+
+    def send_batch(self, messages):
+        throttle = self.get_throttle()
+        throttle.acquire()
+        time.sleep(self.delay())
+        status_code, body = self.respond(messages)
+        if status_code == 429:
+            throttle.backoff(self.retry_after)
+        return parse_send_response(messages, status_code, body)
+
+    async def send_batch_async(self, messages):
+        throttle = self.get_throttle()
+        await asyncio.to_thread(throttle.acquire)
+        await asyncio.sleep(self.delay())
+        status_code, body = self.respond(messages)
+        if status_code == 429:
+            await asyncio.to_thread(throttle.backoff, self.retry_after)
+        return parse_send_response(messages, status_code, body)
+
+    @asynccontextmanager
+    async def async_sender(self, concurrency):
+        yield self.send_batch_async
@@ -1,80 +1,183 @@
-import datetime
 import json
 
 from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from braces import views
 
 # Create your views here.
 from django.views import View
-from django_celery_beat.models import CrontabSchedule, PeriodicTask
-from .tasks import send_mail_func, send_mail_task, ws_task, web_socket_send_mail_task
+
+from clock_work.middleware import set_user_timezone
+from clock_work.scheduling import resolve_when, schedule_many, schedule_once, unique_schedule_name
+from .events import ingest_events
+from .models import MailPayload
+from .payloads import store_payload, store_payloads
+from .recipients import clean_recipients
+from .tasks import (send_mail_func, send_mail_task, send_mail_task_with_schedule, ws_task, web_socket_send_mail_task,
+                    async_send_mail_task)
 from celery_progress.backend import ProgressRecorder
 
 
+class RecipientsMixin:
+    """Clean the posted recipient list once, before anything is enqueued."""
+
+    def get_recipients(self, request):
+        self.recipients = clean_recipients(request.POST.get('emails', ''))
+        return self.recipients.emails
+
+    def no_recipients_response(self):
+        return self.render_json_response({"status": "Failed", "message": "No valid recipients",
+                                          "dropped": self.recipients.dropped}, status=400)
+
+
 class CelerySendMailToAll(View):
     def get(self, *args, **kwargs):
         send_mail_func.delay()
         return HttpResponse("Done")
 
 
-class SendMail(views.JSONResponseMixin, views.AjaxResponseMixin, View):
+class SendMail(RecipientsMixin, views.JSONResponseMixin, views.AjaxResponseMixin, View):
     def post_ajax(self, request, *args, **kwargs):
         headline = request.POST.get('headline')
-        emails = request.POST.get('emails').split(' ')
+        emails = self.get_recipients(request)
         content = request.POST.get('content')
         print(emails)
+        if not emails:
+            return self.no_recipients_response()
         try:
             # raise TypeError("Only integers are allowed")
             # send_mail_task.delay(emails, headline, content)
-            task = send_mail_task.apply_async(args=[emails, headline, content])
-            return self.render_json_response({"status": "Success", "message": "Notes Send", "task_id": task.task_id},
-                                             status=200)
+            payload = store_payload(emails, headline, content)
+            if request.POST.get('mode') == 'async':
+                task = async_send_mail_task.apply_async(kwargs={'payload_id': payload.pk})
+            else:
+                task = send_mail_task.apply_async(kwargs={'payload_id': payload.pk})
+            return self.render_json_response({"status": "Success", "message": "Notes Send", "task_id": task.task_id,
+                                              "dropped": self.recipients.dropped}, status=200)
         except Exception as e:
             print("inside Exception")
             return self.render_json_response({"status": "Failed", "message": "Notes Can't be Sent"}, status=400)
 
 
-class ScheduleMail(views.JSONResponseMixin, views.AjaxResponseMixin, View):
+class ScheduleMail(RecipientsMixin, views.JSONResponseMixin, views.AjaxResponseMixin, View):
     def post_ajax(self, request, *args, **kwargs):
         headline = request.POST.get('headline')
-        emails = request.POST.get('emails').split(' ')
+        emails = self.get_recipients(request)
         content = request.POST.get('content')
-        date_time = request.POST.get('datetime')
         try:
-            date = datetime.datetime.strptime(date_time, '%Y-%m-%dT%H:%M:%S')
-        except:
-            date = datetime.datetime.strptime(date_time, '%Y-%m-%dT%H:%M')
+            # The browser's zone becomes the user's zone for later requests too
+            if request.POST.get('timezone'):
+                set_user_timezone(request, request.POST['timezone'])
+            date = resolve_when(request.POST.get('datetime'))
+        except ValueError as e:
+            return self.render_json_response({'status': 'Failed', 'message': str(e)}, status=400)
         print(emails)
+        if not emails:
+            return self.no_recipients_response()
 
         try:
-            schedule, created = CrontabSchedule.objects.get_or_create(hour=date.hour, minute=date.minute,
-                                                                      day_of_month=date.day, timezone='Asia/Kolkata',
-                                                                      month_of_year=date.month)
-            task = PeriodicTask.objects.create(crontab=schedule, name="schedule_mail_task_"
-                                                                      + str(len(PeriodicTask.objects.all())),
-                                               task='send_email_app.tasks.send_mail_task_with_schedule',
-                                               args=json.dumps((emails, headline, content))
-                                               )
-            return self.render_json_response({'status': 'Success', 'message': 'Reminder Scheduled'}, status=200)
+            # A payload is only kept if its schedule was created too
+            with transaction.atomic():
+                payload = store_payload(emails, headline, content)
+                schedule_once(unique_schedule_name("schedule_mail_task_"), send_mail_task_with_schedule.name, date,
+                              kwargs={'payload_id': payload.pk})
+            return self.render_json_response({'status': 'Success', 'message': 'Reminder Scheduled',
+                                              'dropped': self.recipients.dropped}, status=200)
         except Exception as e:
             print("Error occured:", e)
             return self.render_json_response({'status': 'Failed', 'message': "Reminder Can't be Scheduled"}, status=400)
 
 
-class WebSocketSendMail(views.JSONResponseMixin, views.AjaxResponseMixin, View):
+# Reminders accepted by one BulkScheduleMail request
+MAX_BULK_REMINDERS = 1000
+HEADLINE_MAX_LENGTH = MailPayload._meta.get_field('headline').max_length
+
+
+class BulkScheduleMail(views.JsonRequestResponseMixin, View):
+    """
+    Schedule many mails in one request. The body is a JSON array of
+    ``{"headline", "content", "emails", "datetime", "timezone"}`` objects,
+    ``emails`` being a list or a separated string, ``datetime`` an ISO 8601
+    time and the optional ``timezone`` the zone of a naive ``datetime``
+    (the user's zone by default).
+    Either every reminder is scheduled or, if any is invalid, none is.
+    """
+    require_json = True
+
+    def post(self, request, *args, **kwargs):
+        reminders = self.request_json
+        if not isinstance(reminders, list) or not 0 < len(reminders) <= MAX_BULK_REMINDERS:
+            return self.render_bad_request_response(
+                {'status': 'Failed', 'message': f"Expected a list of 1 to {MAX_BULK_REMINDERS} reminders"})
+
+        payloads, times, dropped, errors = [], [], [], {}
+        for index, reminder in enumerate(reminders):
+            if not isinstance(reminder, dict):
+                errors[index] = "Expected an object"
+                continue
+            headline, content, emails = reminder.get('headline'), reminder.get('content'), reminder.get('emails')
+            if not isinstance(headline, str) or not headline or len(headline) > HEADLINE_MAX_LENGTH:
+                errors[index] = f"headline must be a non-empty string of at most {HEADLINE_MAX_LENGTH} characters"
+                continue
+            if not isinstance(content, str):
+                errors[index] = "content must be a string"
+                continue
+            if not (isinstance(emails, str) or isinstance(emails, list) and all(isinstance(e, str) for e in emails)):
+                errors[index] = "emails must be a string or a list of strings"
+                continue
+            if not isinstance(reminder.get('timezone', ''), str):
+                errors[index] = "timezone must be a string"
+                continue
+            try:
+                when = resolve_when(reminder.get('datetime'), reminder.get('timezone') or None)
+            except ValueError as e:
+                errors[index] = str(e)
+                continue
+            recipients = clean_recipients(emails)
+            dropped.append(recipients.dropped)
+            if not recipients.emails:
+                errors[index] = "No valid recipients"
+                continue
+            payloads.append((recipients.emails, headline, content))
+            times.append(when)
+        if errors:
+            return self.render_bad_request_response({'status': 'Failed', 'errors': errors})
+
+        with transaction.atomic():
+            stored = store_payloads(payloads)
+            scheduled = schedule_many([
+                (unique_schedule_name("schedule_mail_task_"), send_mail_task_with_schedule.name, when, (),
+                 {'payload_id': payload.pk})
+                for payload, when in zip(stored, times)
+            ])
+        return self.render_json_response({'status': 'Success', 'message': f'{len(scheduled)} Reminders Scheduled',
+                                          'ids': [item.pk for item in scheduled], 'dropped': dropped}, status=200)
+
+
+class WebSocketSendMail(RecipientsMixin, views.JSONResponseMixin, views.AjaxResponseMixin, View):
     def post_ajax(self, request, *args, **kwargs):
         headline = request.POST.get('headline')
-        emails = request.POST.get('emails').split(' ')
+        emails = self.get_recipients(request)
         content = request.POST.get('content')
         print(emails)
+        if not emails:
+            return self.no_recipients_response()
         try:
             # raise TypeError("Only integers are allowed")
             # send_mail_task.delay(emails, headline, content)
-            task = web_socket_send_mail_task.apply_async(args=[emails, headline, content])
-            return self.render_json_response({"status": "Success", "message": "Notes Send", "task_id": task.task_id},
-                                             status=200)
+            payload = store_payload(emails, headline, content)
+            if request.POST.get('mode') == 'async':
+                task = async_send_mail_task.apply_async(kwargs={'payload_id': payload.pk, 'websocket': True})
+            else:
+                task = web_socket_send_mail_task.apply_async(kwargs={'payload_id': payload.pk})
+            return self.render_json_response({"status": "Success", "message": "Notes Send", "task_id": task.task_id,
+                                              "dropped": self.recipients.dropped}, status=200)
         except Exception as e:
             print("inside Exception")
             return self.render_json_response({"status": "Failed", "message": "Notes Can't be Sent"}, status=400)
@@ -83,3 +186,26 @@ class WebSocketSendMail(views.JSONResponseMixin, views.AjaxResponseMixin, View):
 def ws_view(request):
     result = ws_task.delay(number=100)
     return render(request, 'ws.html', context={'task_ids': [result.task_id]})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class MailjetEvents(View):
+    """
+    Mailjet event webhook. Configure the callback URL with
+    ``?token=<MAIL_JET_WEBHOOK_TOKEN>``; bounces, blocks, spam complaints and
+    unsubscribes put the address on the suppression list. Without a
+    configured token every request is refused.
+    """
+
+    def post(self, request, *args, **kwargs):
+        token = settings.MAIL_JET_WEBHOOK_TOKEN
+        if not token or not constant_time_compare(request.GET.get('token', ''), token):
+            return HttpResponse(status=403)
+        try:
+            events = json.loads(request.body)
+        except ValueError:
+            return HttpResponse("Invalid JSON", status=400)
+        if isinstance(events, dict):
+            events = [events]
+        stored, suppressed = ingest_events(events if isinstance(events, list) else [])
+        return HttpResponse(f"Stored {stored} events, suppressed {suppressed} addresses")
@@ -5,10 +5,12 @@ from celery import shared_task
 from celery_progress.backend import ProgressRecorder
 from celery_progress.websockets.backend import WebSocketProgressRecorder
 
+from clock_work.progress import ThrottledProgressRecorder
+
 
 @shared_task(bind=True, name='clock_work.tasks.http_task')
 def http_task(self, number):
-    progress_recorder = ProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(ProgressRecorder(self))
     for i in range(number):
         time.sleep(.1)
         progress_recorder.set_progress(i+1, number)
@@ -17,7 +19,7 @@ def http_task(self, number):
 
 @shared_task(bind=True, name='clock_work.tasks.http_error_task')
 def http_error_task(self, number):
-    progress_recorder = ProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(ProgressRecorder(self))
     for i in range(number):
         time.sleep(.1)
         progress_recorder.set_progress(i+1, number)
@@ -28,7 +30,7 @@ def http_error_task(self, number):
 
 @shared_task(bind=True, name='clock_work.tasks.ws_task')
 def ws_task(self, number):
-    progress_recorder = WebSocketProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(WebSocketProgressRecorder(self))
     for i in range(number):
         time.sleep(.1)
         progress_recorder.set_progress(i+1, number)
@@ -37,7 +39,7 @@ def ws_task(self, number):
 
 @shared_task(bind=True, name='clock_work.tasks.ws_error_tasks')
 def ws_error_task(self, number):
-    progress_recorder = WebSocketProgressRecorder(self)
+    progress_recorder = ThrottledProgressRecorder(WebSocketProgressRecorder(self))
     for i in range(number):
         time.sleep(.1)
         progress_recorder.set_progress(i+1, number)